@@ -1,3 +1,5 @@
 
+from .nb_aiopool import NbAioPool
+from .fast_loop import install_fast_loop, fast_run
 
-from .nb_aiopool import NbAioPool
\ No newline at end of file
+__all__ = ['NbAioPool', 'install_fast_loop', 'fast_run']
@@ -77,9 +77,8 @@ async def example_3_batch_submit():
     print("示例3：批量提交任务")
     print("="*60)
     
-    # 批量提交 100 个任务
-    for i in range(100):
-        await my_fun1.submit(i, i+1)
+    # 批量提交 100 个任务，合并成一条 RPUSH，只有一次网络往返
+    await my_fun1.submit_many([((i, i+1), {}) for i in range(100)])
     
     print(f"已提交 100 个任务到 my_queue1")
     print(f"队列大小: {await my_fun1.get_queue_size()}")
@@ -136,8 +135,7 @@ async def example_6_clear_queue():
     print("="*60)
     
     # 提交一些任务
-    for i in range(10):
-        await my_fun1.submit(i, i)
+    await my_fun1.submit_many([((i, i), {}) for i in range(10)])
     
     print(f"提交前队列大小: {await my_fun1.get_queue_size()}")
     
@@ -8,12 +8,13 @@ nb_aio_task - 基于 Redis + NbAioPool 的简易分布式异步任务队列
 """
 
 import asyncio
+import functools
 import json
+import logging
 import pickle
 import traceback
 
-from typing import Callable, Any, List, Optional
-from functools import wraps
+from typing import Callable, Any, Dict, Iterable, List, Optional, Tuple
 
 
 
@@ -30,19 +31,111 @@ except ImportError:
 from nb_aiopool.nb_aiopool import NbAioPool
 from nb_log import get_logger
 
-logger = get_logger(__name__)
+# 每个任务的提交/执行成功日志用 DEBUG 级别（verbose=True 时用 INFO），默认不输出，高吞吐时不必为日志格式化付出开销
+logger = get_logger(__name__, log_level_int=logging.INFO)
+
+# 同一个 redis_url 的所有 AioTask 共用一个 Redis 客户端（内部是连接池），避免每个任务函数各自建立连接
+_shared_redis_clients: Dict[str, aioredis.Redis] = {}
+# 每个 redis_url 上所有 AioTask 的 max_concurrency + 1(消费者自己的 BLPOP) 之和，用来确定默认连接池大小
+_redis_url_concurrency: Dict[str, int] = {}
+# 每个共享客户端当前被多少个 AioTask 持有，最后一个 close() 时才真正断开连接池
+_shared_redis_refcounts: Dict[str, int] = {}
+
+
+def _get_shared_redis(redis_url: str, max_connections: Optional[int] = None) -> aioredis.Redis:
+    """
+    获取 redis_url 对应的共享 Redis 客户端，不存在则创建。
+    创建过程没有 await，单个事件循环内天然不会重复创建，不需要加锁。
+
+    :param redis_url: Redis 连接URL
+    :param max_connections: 连接池最大连接数，默认 max(16, 该 url 上所有任务并发数之和)
+    """
+    client = _shared_redis_clients.get(redis_url)
+    if client is None:
+        if max_connections is None:
+            max_connections = max(16, _redis_url_concurrency.get(redis_url, 0))
+        # BlockingConnectionPool：连接用满时等待空闲连接，而不是直接抛 Too many connections
+        connection_pool = aioredis.BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=max_connections,
+            decode_responses=False  # 使用 bytes 模式以支持 pickle
+        )
+        client = aioredis.Redis(connection_pool=connection_pool)
+        _shared_redis_clients[redis_url] = client
+    _shared_redis_refcounts[redis_url] = _shared_redis_refcounts.get(redis_url, 0) + 1
+    return client
+
+
+async def _release_shared_redis(redis_url: str, client: aioredis.Redis) -> None:
+    """
+    归还 _get_shared_redis 拿到的客户端，引用数归零时移除共享记录并断开连接池。
+    客户端是用外部传入的 connection_pool 创建的，client.close() 不会关闭池里的连接，所以直接 disconnect 连接池。
+    """
+    if _shared_redis_clients.get(redis_url) is not client:
+        return
+    count = _shared_redis_refcounts.get(redis_url, 1) - 1
+    if count > 0:
+        _shared_redis_refcounts[redis_url] = count
+        return
+    del _shared_redis_clients[redis_url]
+    _shared_redis_refcounts.pop(redis_url, None)
+    await client.connection_pool.disconnect()
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data).encode('utf-8')
+
+
+def _get_serializer(name: str) -> Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    """
+    根据名字返回 (dumps, loads)，msgpack/orjson 是可选依赖，用到时才导入
+
+    :param name: 'pickle' / 'json' / 'msgpack' / 'orjson'
+    """
+    if name == 'pickle':
+        return pickle.dumps, pickle.loads
+    if name == 'json':
+        return _json_dumps, json.loads
+    if name == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("请安装 msgpack 依赖: pip install msgpack")
+        return msgpack.packb, functools.partial(msgpack.unpackb, raw=False)
+    if name == 'orjson':
+        try:
+            import orjson
+        except ImportError:
+            raise ImportError("请安装 orjson 依赖: pip install orjson")
+        return orjson.dumps, orjson.loads
+    raise ValueError(f"不支持的序列化方式: {name}，可选 pickle/json/msgpack/orjson")
+
 
 class AioTask:
-    """异步任务包装器"""
-    
+    # 异步任务包装器
+    # 用 __slots__ 固定实例属性；__doc__ 要作为实例属性保存被装饰函数的文档，所以类本身不写 docstring
+    __slots__ = (
+        'func', 'queue_name', 'max_concurrency', 'redis_url', 'max_queue_size', 'use_pickle',
+        'serializer', '_dumps', '_loads', 'batch_window', 'redis_max_connections',
+        'gather_submit_limit', '_submit_sem', 'verbose', '_task_log_level',
+        '_redis', '_pool', '_consuming', '_inflight', '_batch_pop',
+        '_pending_pushes', '_pending_pushes_future', '_flush_task',
+        '__name__', '__qualname__', '__doc__', '__wrapped__',
+    )
+
     def __init__(
         self,
         func: Callable,
         queue_name: str,
         max_concurrency: int = 100,
         redis_url: str = "redis://localhost:6379/0",
-        max_queue_size: int = 100, # NbAioPool 的 asyncio.Queue 内存工作队列大小，不是指redis list的最大长度限制。
+        max_queue_size: int = 100, # NbAioPool 的内存工作队列大小，不是指redis list的最大长度限制。
         use_pickle: bool = True,
+        serializer: Optional[str] = None,
+        batch_window: float = 0,
+        redis_max_connections: Optional[int] = None,
+        gather_submit_limit: int = 0,
+        verbose: bool = False,
     ):
         """
         初始化异步任务
@@ -53,6 +146,14 @@ class AioTask:
         :param redis_url: Redis 连接URL
         :param max_queue_size: NbAioPool 队列大小
         :param use_pickle: 是否使用 pickle 序列化（支持复杂对象），否则使用 json
+        :param serializer: 序列化方式 pickle/json/msgpack/orjson，传了就忽略 use_pickle；
+                           msgpack/orjson 比 pickle/json 更快，但只支持基础类型，需要额外安装
+        :param batch_window: 大于 0 时开启 submit 自动合并，该时间窗口（秒）内并发的 submit 合并成一次 RPUSH
+        :param redis_max_connections: 同一 redis_url 共享连接池的最大连接数，默认 max(16, 该 url 上所有任务并发数之和)，
+                                      以第一个创建连接池的任务为准
+        :param gather_submit_limit: 大于 0 时限制同时进行中的 submit 数量，
+                                    用 asyncio.gather 并发提交大量任务时避免把 redis 连接池占满
+        :param verbose: True 时每个任务的提交/执行成功日志用 INFO 级别输出，默认 DEBUG 级别不输出
         """
         self.func = func
         self.queue_name = f"nb_aio_task:{queue_name}"
@@ -60,40 +161,49 @@ class AioTask:
         self.redis_url = redis_url
         self.max_queue_size = max_queue_size
         self.use_pickle = use_pickle
+        self.serializer = serializer or ('pickle' if use_pickle else 'json')
+        self._dumps, self._loads = _get_serializer(self.serializer)
+        self.batch_window = batch_window
+        self.redis_max_connections = redis_max_connections
+        self.gather_submit_limit = gather_submit_limit
+        self._submit_sem: Optional[asyncio.Semaphore] = None  # 首次 submit 时在事件循环内创建
+        self.verbose = verbose
+        self._task_log_level = logging.INFO if verbose else logging.DEBUG
+        _redis_url_concurrency[redis_url] = _redis_url_concurrency.get(redis_url, 0) + max_concurrency + 1
         
         self._redis: Optional[aioredis.Redis] = None
         self._pool: Optional[NbAioPool] = None
         self._consuming = False
+        self._inflight = 0  # 已从 redis 取出、还没执行完的任务数，用来计算本地还能接收多少任务
+        self._batch_pop = True  # redis < 6.2 不支持 LPOP count，首次失败后退回逐条 BLPOP
+        # batch_window 自动合并提交：等待写入 redis 的任务数据，以及这一批共用的完成通知
+        self._pending_pushes: List[bytes] = []
+        self._pending_pushes_future: Optional[asyncio.Future] = None
+        self._flush_task: Optional[asyncio.Task] = None
         
-        # 保留原函数的元信息
-        wraps(func)(self)
+        # 保留原函数的元信息，只复制必要的几个，不像 functools.wraps 那样把 func.__dict__ 整个拷过来
+        self.__name__ = getattr(func, '__name__', queue_name)
+        self.__qualname__ = getattr(func, '__qualname__', self.__name__)
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
 
     async def __call__(self, *args, **kwargs) -> Any:
         """直接运行函数"""
         return await self.func(*args, **kwargs)
     
     async def _get_redis(self) -> aioredis.Redis:
-        """获取 Redis 连接（单例）"""
+        """获取 Redis 连接（同一 redis_url 的所有任务共享）"""
         if self._redis is None:
-            self._redis = await aioredis.from_url(
-                self.redis_url,
-                decode_responses=False  # 使用 bytes 模式以支持 pickle
-            )
+            self._redis = _get_shared_redis(self.redis_url, self.redis_max_connections)
         return self._redis
     
     def _serialize(self, data: Any) -> bytes:
         """序列化数据"""
-        if self.use_pickle:
-            return pickle.dumps(data)
-        else:
-            return json.dumps(data).encode('utf-8')
+        return self._dumps(data)
     
     def _deserialize(self, data: bytes) -> Any:
         """反序列化数据"""
-        if self.use_pickle:
-            return pickle.loads(data)
-        else:
-            return json.loads(data.decode('utf-8'))
+        return self._loads(data)
     
     async def submit(self, *args, **kwargs) -> None:
         """
@@ -102,14 +212,63 @@ class AioTask:
         :param args: 函数位置参数
         :param kwargs: 函数关键字参数
         """
-        redis = await self._get_redis()
         task_data = {
             'args': args,
             'kwargs': kwargs,
         }
         serialized = self._serialize(task_data)
-        await redis.rpush(self.queue_name, serialized)
-        logger.info(f"✅ 任务已提交到队列 {self.queue_name}: {self.func.__name__}({args}, {kwargs})")
+        if self.batch_window > 0:
+            await self._push_batched(serialized)
+        elif self.gather_submit_limit > 0:
+            if self._submit_sem is None:
+                self._submit_sem = asyncio.Semaphore(self.gather_submit_limit)
+            async with self._submit_sem:
+                redis = await self._get_redis()
+                await redis.rpush(self.queue_name, serialized)
+        else:
+            redis = await self._get_redis()
+            await redis.rpush(self.queue_name, serialized)
+        if logger.isEnabledFor(self._task_log_level):
+            logger.log(self._task_log_level, "✅ 任务已提交到队列 %s: %s(%s, %s)",
+                       self.queue_name, self.func.__name__, args, kwargs)
+
+    async def submit_many(self, items: Iterable[Tuple[tuple, dict]]) -> int:
+        """
+        批量提交任务到 Redis 队列，所有任务合并成一条 RPUSH 命令，只有一次网络往返
+
+        :param items: (args, kwargs) 列表，例如 [((1, 2), {}), ((3,), {'y': 4})]
+        :return: 提交的任务数量
+        """
+        values = [self._serialize({'args': tuple(args), 'kwargs': kwargs}) for args, kwargs in items]
+        if values:
+            redis = await self._get_redis()
+            await redis.rpush(self.queue_name, *values)
+            logger.log(self._task_log_level, "✅ %s 个任务已批量提交到队列 %s: %s",
+                       len(values), self.queue_name, self.func.__name__)
+        return len(values)
+
+    async def _push_batched(self, serialized: bytes) -> None:
+        """把任务数据放进当前批次，等这一批写入 redis 后返回"""
+        if self._pending_pushes_future is None:
+            self._pending_pushes_future = asyncio.get_running_loop().create_future()
+            self._flush_task = asyncio.create_task(self._flush_pushes())
+        self._pending_pushes.append(serialized)
+        # shield：单个 submit 被取消时不能把整批共用的 future 也取消掉
+        await asyncio.shield(self._pending_pushes_future)
+
+    async def _flush_pushes(self) -> None:
+        """等待 batch_window 后，把这段时间内攒下的任务用一条 RPUSH 写入 redis"""
+        await asyncio.sleep(self.batch_window)
+        values, fut = self._pending_pushes, self._pending_pushes_future
+        self._pending_pushes = []
+        self._pending_pushes_future = None
+        try:
+            redis = await self._get_redis()
+            await redis.rpush(self.queue_name, *values)
+        except Exception as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(None)
     
     async def _execute_task(self, task_data: bytes) -> Any:
         """执行单个任务"""
@@ -119,48 +278,96 @@ class AioTask:
             kwargs = data.get('kwargs', {})
             
             result = await self.func(*args, **kwargs)
-            logger.info(f"✅ 任务执行成功: {self.func.__name__}({args}, {kwargs}) -> {result}")
+            if logger.isEnabledFor(self._task_log_level):
+                logger.log(self._task_log_level, "✅ 任务执行成功: %s(%s, %s) -> %s",
+                           self.func.__name__, args, kwargs, result)
             return result
         
         except Exception as e:
-            logger.error(f"❌ 任务执行失败: {self.func.__name__}", exc_info=True)
+            logger.error("❌ 任务执行失败: %s", self.func.__name__, exc_info=True)
             raise
     
+    def _on_pool_task_done(self, fut: asyncio.Future) -> None:
+        """NbAioPool 中的任务完成回调"""
+        self._inflight -= 1
+        if not fut.cancelled():
+            fut.exception()  # 异常已在 _execute_task 中记录日志，这里标记为已读取，避免 asyncio 再报 never retrieved
+
+    async def _pop_batch(self, redis: aioredis.Redis) -> List[bytes]:
+        """
+        非阻塞地批量取出任务，一次 LPOP count 往返取回多条，数量不超过本地空闲容量
+
+        :return: 任务数据列表，队列为空或本地没有空闲容量时返回空列表
+        """
+        free_slots = self.max_concurrency + self.max_queue_size - self._inflight
+        if not self._batch_pop or free_slots <= 0:
+            return []
+        try:
+            items = await redis.lpop(self.queue_name, min(free_slots, 32))
+        except aioredis.ResponseError:
+            self._batch_pop = False
+            logger.warning(f"⚠️  Redis 不支持 LPOP count（需要 6.2+），改为逐条 BLPOP: {self.queue_name}")
+            return []
+        return items or []
+
     async def consume(self, timeout: int = 5) -> None:
         """
         启动消费者，持续从 Redis 队列消费任务
+
+        队列有积压时用 LPOP count 批量取任务，队列为空时才退回 BLPOP 阻塞等待。
         
-        :param timeout: 每次 blpop 的超时时间（秒）
+        :param timeout: 每次 blpop 的超时时间（秒），也是 stop() 之后消费者退出的最长等待时间。
+                        不会去取消正在进行的 BLPOP，因为 redis 可能已经弹出了消息，取消会导致该消息丢失
         """
         if self._consuming:
             logger.warning(f"⚠️  消费者已在运行: {self.queue_name}")
             return
         
         self._consuming = True
+        self._inflight = 0
         redis = await self._get_redis()
         
         # 创建 NbAioPool
         self._pool = NbAioPool(
             max_concurrency=self.max_concurrency,
-            max_queue_size=self.max_queue_size
+            max_queue_size=self.max_queue_size,
+            single_producer=True,  # 只有 consume 循环一个协程往池里提交任务
         )
         
         logger.info(f"🚀 启动消费者: {self.queue_name} (并发数: {self.max_concurrency})")
         
         try:
             while self._consuming:
-                # 阻塞式获取任务
-                result = await redis.blpop(self.queue_name, timeout=timeout)
-                
-                if result is None:
-                    # 超时，继续循环
-                    await asyncio.sleep(0.1)
-                    continue
-                
-                _, task_data = result
-                
-                # 提交到 NbAioPool 执行（利用背压机制）
-                await self._pool.submit(self._execute_task(task_data))
+                batch = await self._pop_batch(redis)
+                if not batch:
+                    # 队列为空（或本地已满），阻塞式获取任务
+                    result = await redis.blpop(self.queue_name, timeout=timeout)
+
+                    if result is None:
+                        # 超时，立即回到循环开头重新检查 _consuming 并再次 BLPOP，BLPOP 本身已经是阻塞等待，不需要再 sleep
+                        continue
+
+                    _, task_data = result
+                    batch = [task_data]
+
+                submitted = 0
+                try:
+                    for task_data in batch:
+                        # 逐个提交到 NbAioPool 执行（利用背压机制），并发仍由 pool 控制
+                        coro = self._execute_task(task_data)
+                        self._inflight += 1
+                        try:
+                            fut = await self._pool.submit(coro)
+                        except BaseException:
+                            self._inflight -= 1
+                            coro.close()
+                            raise
+                        fut.add_done_callback(self._on_pool_task_done)
+                        submitted += 1
+                finally:
+                    if submitted < len(batch):
+                        # 阻塞在 submit 时被取消/出错：已弹出但还没进池的消息放回队列头部，保持原顺序，不丢消息
+                        await redis.lpush(self.queue_name, *reversed(batch[submitted:]))
         
         except asyncio.CancelledError:
             logger.info(f"🛑 消费者被取消: {self.queue_name}")
@@ -191,10 +398,10 @@ class AioTask:
         logger.info(f"🗑️  队列已清空: {self.queue_name}")
     
     async def close(self) -> None:
-        """关闭 Redis 连接"""
+        """释放 Redis 连接（同一 redis_url 的所有任务共享连接池，最后一个任务 close 时才真正断开）"""
         if self._redis:
-            await self._redis.close()
-            self._redis = None
+            redis, self._redis = self._redis, None
+            await _release_shared_redis(self.redis_url, redis)
 
 
 def aio_task(
@@ -203,6 +410,11 @@ def aio_task(
     redis_url: str = "redis://localhost:6379/0",
     max_queue_size: int = 1000,
     use_pickle: bool = True,
+    serializer: Optional[str] = None,
+    batch_window: float = 0,
+    redis_max_connections: Optional[int] = None,
+    gather_submit_limit: int = 0,
+    verbose: bool = False,
 ):
     """
     异步任务装饰器
@@ -227,6 +439,11 @@ def aio_task(
     :param redis_url: Redis 连接URL
     :param max_queue_size: NbAioPool 队列大小
     :param use_pickle: 是否使用 pickle 序列化
+    :param serializer: 序列化方式 pickle/json/msgpack/orjson，传了就忽略 use_pickle
+    :param batch_window: 大于 0 时开启 submit 自动合并，该时间窗口（秒）内并发的 submit 合并成一次 RPUSH
+    :param redis_max_connections: 同一 redis_url 共享连接池的最大连接数，默认 max(16, 该 url 上所有任务并发数之和)
+    :param gather_submit_limit: 大于 0 时限制同时进行中的 submit 数量，避免 gather 并发提交时占满 redis 连接
+    :param verbose: True 时每个任务的提交/执行成功日志用 INFO 级别输出
     """
     def decorator(func: Callable) -> AioTask:
         if not asyncio.iscoroutinefunction(func):
@@ -239,6 +456,11 @@ def aio_task(
             redis_url=redis_url,
             max_queue_size=max_queue_size,
             use_pickle=use_pickle,
+            serializer=serializer,
+            batch_window=batch_window,
+            redis_max_connections=redis_max_connections,
+            gather_submit_limit=gather_submit_limit,
+            verbose=verbose,
         )
     
     return decorator
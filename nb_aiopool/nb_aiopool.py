@@ -1,48 +1,201 @@
+import collections
 import concurrent.futures
 
 import asyncio
-from typing import Any, Coroutine, List, TypeVar
+from typing import Any, Coroutine, Iterable, List, Optional, TypeVar
 
 T = TypeVar("T")  # 用于标注异步函数返回类型
 
 
+class _TaskQueue:
+    """
+    NbAioPool 内部使用的轻量有界队列，只在单个事件循环内使用，接口是 asyncio.Queue 的子集。
+
+    - 任务存放在 collections.deque 里
+    - 队列未满、所有任务完成(join) 用 asyncio.Event 通知，task_done 只是一个计数器
+    - 空闲 worker 放在等待者队列里，每次 put 只唤醒一个 worker，避免一次 put 唤醒全部空闲 worker 的惊群
+    - close() 一次性唤醒全部等待者，之后队列取空时 get() 直接返回哨兵 (None, None)，不需要给每个 worker 单独放哨兵
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self._maxsize = maxsize
+        self._items: collections.deque = collections.deque()
+        self._getters: collections.deque = collections.deque()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._unfinished_tasks = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._closed = False
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return 0 < self._maxsize <= len(self._items)
+
+    def _wakeup_getter(self):
+        getters = self._getters
+        while getters:
+            getter = getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def put_nowait(self, item):
+        items = self._items
+        if 0 < self._maxsize <= len(items):
+            raise asyncio.QueueFull
+        items.append(item)
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        if len(items) == self._maxsize:
+            self._not_full.clear()
+        if self._getters:
+            self._wakeup_getter()
+
+    async def put(self, item):
+        while 0 < self._maxsize <= len(self._items):
+            await self._not_full.wait()
+        self.put_nowait(item)
+
+    def get_nowait(self):
+        items = self._items
+        if not items:
+            raise asyncio.QueueEmpty
+        item = items.popleft()
+        if len(items) == self._maxsize - 1:
+            self._not_full.set()
+        return item
+
+    def close(self):
+        self._closed = True
+        getters = self._getters
+        while getters:
+            getter = getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+
+    async def get(self):
+        items = self._items
+        while not items:
+            if self._closed:
+                return None, None
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                try:
+                    self._getters.remove(getter)
+                except ValueError:
+                    pass
+                # 已经被唤醒但自己被取消了，把唤醒机会让给下一个 worker
+                if items and not getter.cancelled():
+                    self._wakeup_getter()
+                raise
+        return self.get_nowait()
+
+    def task_done(self):
+        if self._unfinished_tasks <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished_tasks -= 1
+        if self._unfinished_tasks == 0:
+            self._finished.set()
+
+    async def join(self):
+        if self._unfinished_tasks > 0:
+            await self._finished.wait()
+
+
 class NbAioPool:
     """
-    NbAioPool 是一个经典的基于 `asyncio.Queue`有界队列 的并发池。
-    它通过固定数量的后台工作协程（worker）来消费队列中的任务，实现稳定可靠的并发控制。
+    NbAioPool 是一个经典的基于有界队列的并发池。
+    它通过后台工作协程（worker，按需创建，最多 max_concurrency 个）来消费队列中的任务，实现稳定可靠的并发控制。
     """
-    def __init__(self, max_concurrency: int = 100, max_queue_size: int = 1000):
+    def __init__(self, max_concurrency: int = 100, max_queue_size: int = 1000, single_producer: bool = False):
+        """
+        :param max_concurrency: 最大并发数
+        :param max_queue_size: 队列大小
+        :param single_producer: 只有一个协程在提交任务时（例如 aio_task 的消费循环）可以设为 True，
+                                submit 首次启动时不加锁，队列未满时直接同步入队，不经过 put() 协程
+        """
         self._max_concurrency = max_concurrency
-        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._single_producer = single_producer
+        self._queue: _TaskQueue = _TaskQueue(maxsize=max_queue_size)
+        # 并发槽位：worker 执行任务和 run() 的快速路径共用，保证总并发不超过 max_concurrency
+        self._sem = asyncio.Semaphore(max_concurrency)
         self._workers: List[asyncio.Task] = []
+        self._idle_workers = 0  # 没有在执行任务的 worker 数量，用于按需创建 worker
         self._running = False
         self._stopped = False
         self._lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 在 _ensure_started 中缓存，submit 热路径直接使用
+        self._loop_debug = False
    
 
     async def _worker(self):
+        queue = self._queue
+        sem = self._sem
         while True:
-            coro, fut = await self._queue.get()
+            # 队列有积压时直接同步取下一个任务，不再创建 get() 协程；队列空了才挂起等待。
+            # 每次只取一个，不把多个任务囤积在同一个 worker 里，空闲 worker 仍然能并发处理其余任务。
+            if queue.empty():
+                coro, fut = await queue.get()
+            else:
+                coro, fut = queue.get_nowait()
             if coro is None:
-                # 哨兵，退出 worker
-                self._queue.task_done()
+                # 队列已关闭且取空，退出 worker
+                self._idle_workers -= 1
                 break
+            self._idle_workers -= 1
             try:
-                result = await coro
+                async with sem:
+                    result = await coro
                 if not fut.cancelled():
                     fut.set_result(result)
             except Exception as e:
                 if not fut.cancelled():
                     fut.set_exception(e)
-            finally:
-                self._queue.task_done()
+            except BaseException:
+                # 任务里漏出了 CancelledError / KeyboardInterrupt 等，worker 随之退出：
+                # 不再计入空闲，从 _workers 移除，再按积压量补 worker，避免后续任务没人执行
+                fut.cancel()
+                queue.task_done()
+                self._workers.remove(asyncio.current_task())
+                self._maybe_add_worker()
+                raise
+            queue.task_done()
+            self._idle_workers += 1
+            # 及时释放本次任务的 coro/future/result 引用，避免空闲 worker 一直拖住上一个任务的结果对象
+            coro = fut = result = None
 
     async def _ensure_started(self):
+        if self._running:  # 启动后不再每次 submit 都去获取锁
+            return
         async with self._lock:
             if not self._running:
-                self._workers = [asyncio.create_task(self._worker()) for _ in range(self._max_concurrency)]
-                self._running = True
+                self._start()
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_debug = self._loop.get_debug()
+        self._workers = []
+        self._idle_workers = 0
+        self._running = True
 
+    def _maybe_add_worker(self):
+        """
+        按需创建 worker：排队的任务数超过空闲 worker 数时才新建一个，最多 max_concurrency 个。
+        实际并发需求远小于 max_concurrency 时，不会一次性创建一大堆空闲的 worker Task。
+        """
+        if self._idle_workers < self._queue.qsize() and len(self._workers) < self._max_concurrency:
+            self._idle_workers += 1  # 新 worker 还没开始运行，先算作空闲，避免重复创建
+            self._workers.append(self._loop.create_task(self._worker()))
 
 
     async def submit(self,
@@ -58,16 +211,25 @@ class NbAioPool:
         if self._stopped:
             raise RuntimeError("Pool is stopped, cannot submit new tasks.")
 
-        await self._ensure_started()
+        if self._single_producer:
+            # 只有一个生产者，检查和启动之间没有 await，不需要锁
+            if not self._running:
+                self._start()
+        else:
+            await self._ensure_started()
+        if self._loop_debug:
+            assert asyncio.get_running_loop() is self._loop, "Pool is bound to another event loop"
         if future is None:
-            future = asyncio.get_running_loop().create_future()
+            future = self._loop.create_future()
         try:
-            if block:
+            # 单生产者且队列未满时 put_nowait 一定成功，直接同步入队
+            if block and (not self._single_producer or self._queue.full()):
                 await self._queue.put((coro, future))
             else:
                 self._queue.put_nowait((coro, future))
         except asyncio.QueueFull:
             future.set_exception(RuntimeError("Queue full"))
+        self._maybe_add_worker()
         return future
 
     async def run(self,
@@ -77,11 +239,20 @@ class NbAioPool:
         """
         await pool.run 相当于 await await pool.submit
 
+        快速路径：队列为空且还有空闲并发槽位时，直接在当前协程里 await coro，
+        省掉一次 Future 创建和 queue put/get。因此 run() 不保证和 submit() 提交的任务严格 FIFO。
+
         :param coro: 协程对象
         :param block: True 队列满等待，False 队列满立即抛异常
         :param future: 可选的外部 Future 对象
         :return: 协程执行结果
         """
+        if future is None and not self._stopped and not self._sem.locked() and self._queue.empty():
+            await self._sem.acquire()  # 未 locked 时不会挂起
+            try:
+                return await coro
+            finally:
+                self._sem.release()
         future: asyncio.Future = await self.submit(coro, block=block, future=future)
         return await future
 
@@ -102,12 +273,26 @@ class NbAioPool:
         return asyncio.run_coroutine_threadsafe(
             self.submit(coro, block=block, future=future), loop)
 
+    def sync_submit_nowait(self,
+                           coro: Coroutine[Any, Any, T],
+                           loop: asyncio.AbstractEventLoop) -> None:
+        """
+        同步提交任务，发后不管，返回 None。
+        不像 sync_submit 那样创建 concurrent.futures.Future 桥接结果，调用方拿不到任务结果，
+        提交失败（例如池已关闭）也只会在 loop 里记录为未获取的 Task 异常。
+        :param coro: 协程对象
+        :param loop: 事件循环对象
+        """
+        if loop is None:
+            raise ValueError("please pass loop")
+        loop.call_soon_threadsafe(loop.create_task, self.submit(coro))
+
     async def batch_submit(self,
-                           coros: List[Coroutine[Any, Any, T]],
+                           coros: Iterable[Coroutine[Any, Any, T]],
                            block: bool = True) -> List[asyncio.Future]:
         """
         批量提交任务，返回 Future 列表
-        :param coros: 协程对象列表
+        :param coros: 协程对象列表，也可以是生成器，边生成边提交，不用先把所有协程对象都建好放在列表里
         :param block: True 队列满等待，False 队列满立即抛异常
         :return: Future 列表
         """
@@ -119,21 +304,27 @@ class NbAioPool:
         return futures
 
     async def batch_run(self,
-                        coros: List[Coroutine[Any, Any, T]],
+                        coros: Iterable[Coroutine[Any, Any, T]],
                         block: bool = True) -> List[T]:
         """
         批量提交任务，返回结果列表
-        :param coros: 协程对象列表
+        :param coros: 协程对象列表，也可以是生成器
         :param block: True 队列满等待，False 队列满立即抛异常
         :return: 结果列表
         """
         futures = await self.batch_submit(coros, block=block)
         return await asyncio.gather(*futures)
 
+    async def join(self):
+        """
+        等待已提交的任务全部完成（包括任务执行过程中再提交的子任务），不关闭池，之后还可以继续 submit
+        """
+        await self._queue.join()
+
     async def shutdown(self, wait: bool = True):
         """
         优雅关闭池
-        :param wait: True 等待任务完成并 worker 退出，False 仅发哨兵后台退出
+        :param wait: True 等待任务完成并 worker 退出，False 仅关闭队列，worker 执行完剩余任务后在后台退出
         """
         self._stopped = True
 
@@ -141,9 +332,8 @@ class NbAioPool:
             # 等待队列中所有任务完成
             await self._queue.join()
 
-        # 发送哨兵，确保所有 worker 能退出
-        for _ in range(self._max_concurrency):
-            await self._queue.put((None, None))
+        # 关闭队列，一次性唤醒所有空闲 worker，队列取空后 worker 自行退出
+        self._queue.close()
 
         if wait:
             # 等待所有 worker 完全退出
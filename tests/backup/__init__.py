@@ -1,7 +1,16 @@
-from nb_aiopool.smart_aiopool import SmartAioPool , shutdown_all_smart_aiopools,smart_run
-from nb_aiopool.common_aiopool import CommonAioPool ,shutdown_all_common_aiopools
-from nb_aiopool.no_queue_aiopool import NoQueueAioPool ,wait_all_no_queue_aiopools
-from nb_aiopool.no_queue_aiopool_use_condition import NoQueueAioPoolUseCondition ,wait_all_no_queue_aiopools_use_condition
+# 旧版各种 pool 的备份，已不在 nb_aiopool 包里，用相对导入，和现在的 nb_aiopool 包互不干扰
+from .smart_aiopool import SmartAioPool , shutdown_all_smart_aiopools,smart_run
+from .common_aiopool import CommonAioPool ,shutdown_all_common_aiopools
+from .no_queue_aiopool import NoQueueAioPool ,wait_all_no_queue_aiopools
+from .no_queue_aiopool_use_condition import NoQueueAioPoolUseCondition ,wait_all_no_queue_aiopools_use_condition
+
+__all__ = [
+    'SmartAioPool', 'shutdown_all_smart_aiopools', 'smart_run',
+    'CommonAioPool', 'shutdown_all_common_aiopools',
+    'NoQueueAioPool', 'wait_all_no_queue_aiopools',
+    'NoQueueAioPoolUseCondition', 'wait_all_no_queue_aiopools_use_condition',
+    'wait_all_types_aiopools',
+]
 
 
 async def wait_all_types_aiopools():
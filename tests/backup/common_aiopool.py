@@ -1,7 +1,7 @@
 import concurrent.futures
 import weakref
 import asyncio
-from typing import Any, Coroutine, List, TypeVar
+from typing import Any, Coroutine, List, Optional, TypeVar
 
 T = TypeVar("T")  # 用于标注异步函数返回类型
 
@@ -20,6 +20,8 @@ class CommonAioPool:
         self._running = False
         self._stopped = False
         self._lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_debug = False
         _active_pools.add(self)
 
     async def _worker(self):
@@ -38,10 +40,15 @@ class CommonAioPool:
                     fut.set_exception(e)
             finally:
                 self._queue.task_done()
+                coro = fut = result = None
 
     async def _ensure_started(self):
+        if self._running:  # 启动后不再每次 submit 都去获取锁
+            return
         async with self._lock:
             if not self._running:
+                self._loop = asyncio.get_running_loop()
+                self._loop_debug = self._loop.get_debug()
                 self._workers = [asyncio.create_task(self._worker()) for _ in range(self._max_concurrency)]
                 self._running = True
 
@@ -61,8 +68,10 @@ class CommonAioPool:
             raise RuntimeError("Pool is stopped, cannot submit new tasks.")
 
         await self._ensure_started()
+        if self._loop_debug:
+            assert asyncio.get_running_loop() is self._loop, "Pool is bound to another event loop"
         if future is None:
-            future = asyncio.get_running_loop().create_future()
+            future = self._loop.create_future()
         try:
             if block:
                 await self._queue.put((coro, future))
@@ -139,8 +148,9 @@ class CommonAioPool:
         await self.shutdown(wait=True)
 
 async def shutdown_all_common_aiopools():
-    for pool in _active_pools:
-        await pool.shutdown(wait=True)
+    # 先拷贝快照再 await，避免迭代 WeakSet 期间有 pool 被回收
+    pools = list(_active_pools)
+    await asyncio.gather(*(pool.shutdown(wait=True) for pool in pools), return_exceptions=True)
     _active_pools.clear()
 
 
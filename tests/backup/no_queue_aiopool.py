@@ -1,19 +1,27 @@
 import asyncio
-from typing import Awaitable, Optional, Set
+import contextvars
+import functools
+import sys
+from typing import Awaitable, Iterable, List, Optional, Set
 import weakref
 
 _active_pools = weakref.WeakSet()
+_CREATE_TASK_ACCEPTS_CONTEXT = sys.version_info >= (3, 11)  # loop.create_task(coro, context=...) 从 3.11 开始支持
 
 class NoQueueAioPool:
     """
-    NoQueueAioPool 是一个无队列的协程池，它通过一个条件变量来控制并发任务的数量。
+    NoQueueAioPool 是一个无队列的协程池，它通过 asyncio.Semaphore 来控制并发任务的数量。
     当任务数量达到最大并发数时，新提交的任务会被阻塞，直到有任务完成并释放空位。
     实测性能比 NoQueueAioPoolUseCondition 好，实现更简单。
+    submit 热路径不做嵌套任务死锁检测（不遍历调用栈），压测时没有额外开销；任务里要再提交子任务时用 child() 创建的子池，避免父子任务抢同一批槽位。
     """
     def __init__(self, max_concurrency: int):
         self.max_concurrency = max_concurrency
         self.tasks: Set[asyncio.Task] = set()
         self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 在 _bind_loop 中缓存，submit 热路径直接使用
+        self._loop_debug = False
+        self._loop_checked = False  # 为 False 时下一次 submit 先走 _bind_loop；pool 空闲时重置，跨 asyncio.run 复用时在那里换绑
         _active_pools.add(self)
         
     async def submit(self, coro: Awaitable, future: Optional[asyncio.Future] = None) -> asyncio.Future:
@@ -22,34 +30,123 @@ class NoQueueAioPool:
         - future: 外部传入 future，否则内部创建
         - 返回 future
         """
+        loop = self._loop if self._loop_checked else self._bind_loop()
+        if self._loop_debug:
+            assert asyncio.get_running_loop() is loop, "Pool is bound to another event loop"
         # 如果没有传 future，就创建一个
         if future is None:
-            future = asyncio.get_event_loop().create_future()
+            future = loop.create_future()
+
+        # 背压：任务满时挂起等待空位，有任务完成 release 时立即被唤醒，不再 sleep 轮询
+        try:
+            await self.semaphore.acquire()
+        except BaseException:
+            self._close_unstarted(coro)
+            raise
+        self._spawn(coro, future)
+        return future
 
-        async def wrapper():
-            try:
-                result = await coro
-                if not future.done():
-                    future.set_result(result)
-            except Exception as e:
-                if not future.done():
-                    future.set_exception(e)
-
-        # 背压：任务满时让出事件循环给 worker 执行
-        while len(self.tasks) >= self.max_concurrency:
-            await asyncio.sleep(0.01)
-
-        # await self.semaphore.acquire()
-        task = asyncio.create_task(wrapper())
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        首次 submit 和 pool 空闲后的第一次 submit 调用：缓存当前运行的事件循环。
+        模块级 pool 跨两次 asyncio.run 复用时，旧 loop 上的任务都已结束，就换绑到新 loop 并重建 semaphore；
+        还有任务在别的 loop 上运行时直接报错，不会悄悄驱动一个已关闭的 loop。
+        其余 submit 直接用缓存的 loop，和 NbAioPool 一样只在 debug 模式下检查是不是同一个 loop。
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self.tasks:
+                raise RuntimeError("Pool is bound to another event loop")
+            self._loop = loop
+            self._loop_debug = loop.get_debug()
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop_checked = True
+        return loop
+
+    @staticmethod
+    def _close_unstarted(coro: Awaitable):
+        """等槽位时被取消（比如外面套了 wait_for 超时），协程还没开始执行，关掉它，避免 never awaited 警告"""
+        if asyncio.iscoroutine(coro):
+            coro.close()
+
+    def _spawn(self, coro: Awaitable, future: asyncio.Future, context: Optional[contextvars.Context] = None):
+        """
+        已经拿到 semaphore 槽位后调用：直接把 coro 包成 Task，不再套一层 wrapper 协程；结果在 done 回调里同步转交给 future
+        :param context: 给 task 指定的 contextvars 上下文，None 时由 asyncio 为每个 task 复制一份；
+                        只对协程生效，Future 等其他 awaitable 仍交给 ensure_future
+        """
+        if context is not None and asyncio.iscoroutine(coro):
+            task = self._loop.create_task(coro, context=context)
+        else:
+            task = asyncio.ensure_future(coro)
         self.tasks.add(task)
+        task.add_done_callback(functools.partial(self._on_done, future))
+
+    def _on_done(self, future: asyncio.Future, t: asyncio.Task):
+        self.tasks.discard(t)
+        if not self.tasks:
+            self._loop_checked = False
+        self.semaphore.release()  # 放在 done 回调里释放，task 未开始就被取消也不会漏掉槽位
+        self._set_future_from_task(future, t)
+
+    @staticmethod
+    def _set_future_from_task(future: asyncio.Future, t: asyncio.Task):
+        """把 task 的结果/异常/取消状态转交给对外返回的 future"""
+        if future.done():
+            return
+        if t.cancelled():
+            future.cancel()
+            return
+        exc = t.exception()
+        if exc is None:
+            future.set_result(t.result())
+        else:
+            future.set_exception(exc)
+
+    async def batch_submit(self, coros: Iterable[Awaitable], copy_context: bool = True) -> List[asyncio.Future]:
+        """
+        批量提交任务，返回 Future 列表
+        事件循环只查找一次；有空位时 semaphore.acquire() 不会挂起，所以一批协程只在并发满时才让出 loop。
+        :param coros: 协程对象列表
+        :param copy_context: True 每个 task 各自复制一份 contextvars 上下文（asyncio 默认行为）；
+                             False 整批 task 共用一份上下文，省掉每个 task 的 Context 分配，
+                             只适合不用 contextvars 或者不在任务里 ContextVar.set 的协程（需要 Python 3.11+，更低版本忽略此参数）
+        :return: Future 列表
+        """
+        loop = self._loop if self._loop_checked else self._bind_loop()
+        if self._loop_debug:
+            assert asyncio.get_running_loop() is loop, "Pool is bound to another event loop"
+        context = None
+        if not copy_context and _CREATE_TASK_ACCEPTS_CONTEXT:
+            context = contextvars.copy_context()
+        semaphore = self.semaphore
+        futures = []
+        for coro in coros:
+            future = loop.create_future()
+            try:
+                await semaphore.acquire()
+            except BaseException:
+                self._close_unstarted(coro)
+                raise
+            self._spawn(coro, future, context)
+            futures.append(future)
+        return futures
+
+    def child(self, max_concurrency: Optional[int] = None) -> "NoQueueAioPool":
+        """
+        创建子池，给父池里的任务提交嵌套子任务用。
+        子池和父池共用事件循环，但有自己独立的 semaphore，父任务占满父池的槽位时子任务仍能拿到空位，不会互相等待死锁。
+        :param max_concurrency: 子池最大并发数，默认和父池一样
+        :return: 子池
+        """
+        child = NoQueueAioPool(self.max_concurrency if max_concurrency is None else max_concurrency)
+        child._loop = self._loop
+        return child
 
-        def _on_done(t):
-            self.tasks.discard(t)
-            # self.semaphore.release()
-
-        task.add_done_callback(_on_done)
-
-        return future
+    @property
+    def active_count(self) -> int:
+        """当前正在运行的任务数"""
+        return len(self.tasks)
 
     async def run(self, coro: Awaitable,future: Optional[asyncio.Future] = None) :
         """
@@ -76,6 +173,6 @@ class NoQueueAioPool:
 
 
 async def wait_all_no_queue_aiopools():
-    for pool in _active_pools:
-        await pool.wait()
+    pools = list(_active_pools)
+    await asyncio.gather(*(pool.wait() for pool in pools), return_exceptions=True)
     _active_pools.clear()
\ No newline at end of file
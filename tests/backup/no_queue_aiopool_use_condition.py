@@ -1,4 +1,5 @@
 import asyncio
+import functools
 from typing import Awaitable, Optional, Set
 
 import weakref
@@ -9,7 +10,11 @@ class NoQueueAioPoolUseCondition:
     def __init__(self, max_concurrency: int):
         self.max_concurrency = max_concurrency
         self.tasks: Set[asyncio.Task] = set()
-        self._condition = asyncio.Condition()  # 条件变量：自带锁 + 等待/通知机制
+        # 空位通知：任务完成时 set + clear 一次，唤醒正在等待空位的协程，不需要再额外创建 cleanup 协程去拿锁 notify
+        self._slot_free = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 在 _bind_loop 中缓存，submit 热路径直接使用
+        self._loop_debug = False
+        self._loop_checked = False  # 为 False 时下一次 submit 先走 _bind_loop；pool 空闲时重置，跨 asyncio.run 复用时在那里换绑
         _active_pools.add(self)
 
     async def submit(self, coro: Awaitable, future: Optional[asyncio.Future] = None) -> asyncio.Future:
@@ -19,42 +24,62 @@ class NoQueueAioPoolUseCondition:
         :param future: 可选外部 Future
         :return: asyncio.Future
         """
+        loop = self._loop if self._loop_checked else self._bind_loop()
+        if self._loop_debug:
+            assert asyncio.get_running_loop() is loop, "Pool is bound to another event loop"
         if future is None:
-            future = asyncio.get_running_loop().create_future()
-
-        async def wrapper():
-            try:
-                result = await coro
-                if not future.done():
-                    future.set_result(result)
-            except Exception as e:
-                if not future.done():
-                    future.set_exception(e)
-
-        # 使用条件变量保护临界区
-        async with self._condition:
-            # 背压：任务满时等待有空位
-            while len(self.tasks) >= self.max_concurrency:
-                await self._condition.wait()  # 自动释放锁并等待通知
-            
-            # 创建并添加任务
-            task = asyncio.create_task(wrapper())
-            self.tasks.add(task)
-            
-            # 任务完成回调
-            def _on_done(t):
-                async def cleanup():
-                    async with self._condition:
-                        self.tasks.discard(t)
-                        # 通知一个等待的协程
-                        self._condition.notify()
-                
-                asyncio.create_task(cleanup())
-            
-            task.add_done_callback(_on_done)
+            future = loop.create_future()
+
+        # 背压：任务满时等待有空位。检查和 add 之间没有 await，单个事件循环内天然是原子的
+        while len(self.tasks) >= self.max_concurrency:
+            await self._slot_free.wait()
+
+        # 创建并添加任务，直接把 coro 包成 Task，不再套一层 wrapper 协程
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(functools.partial(self._on_done, future))
 
         return future
 
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        首次 submit 和 pool 空闲后的第一次 submit 调用：缓存当前运行的事件循环，换了新 loop 时重建 _slot_free，还有任务在别的 loop 上时报错。
+        其余 submit 直接用缓存的 loop，和 NbAioPool 一样只在 debug 模式下检查是不是同一个 loop。
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self.tasks:
+                raise RuntimeError("Pool is bound to another event loop")
+            self._loop = loop
+            self._loop_debug = loop.get_debug()
+            self._slot_free = asyncio.Event()
+        self._loop_checked = True
+        return loop
+
+    def _on_done(self, future: asyncio.Future, t: asyncio.Task):
+        """任务完成回调，在事件循环中同步执行，不产生新的协程"""
+        self.tasks.discard(t)
+        if not self.tasks:
+            self._loop_checked = False
+        # set 会唤醒当前所有等待者，紧接着 clear，让之后的 wait 继续挂起；被唤醒的协程会在 while 里重新检查空位
+        self._slot_free.set()
+        self._slot_free.clear()
+        self._set_future_from_task(future, t)
+
+    @staticmethod
+    def _set_future_from_task(future: asyncio.Future, t: asyncio.Task):
+        """把 task 的结果/异常/取消状态转交给对外返回的 future"""
+        if future.done():
+            return
+        if t.cancelled():
+            future.cancel()
+            return
+        exc = t.exception()
+        if exc is None:
+            future.set_result(t.result())
+        else:
+            future.set_exception(exc)
+
     async def run(self, coro: Awaitable, future: Optional[asyncio.Future] = None):
         """提交任务并等待结果"""
         fut = await self.submit(coro, future=future)
@@ -73,6 +98,6 @@ class NoQueueAioPoolUseCondition:
 
 
 async def wait_all_no_queue_aiopools_use_condition():
-    for pool in _active_pools:
-        await pool.wait()
+    pools = list(_active_pools)
+    await asyncio.gather(*(pool.wait() for pool in pools), return_exceptions=True)
     _active_pools.clear()
\ No newline at end of file
@@ -16,6 +16,7 @@ HTTP压力测试工具 - 无池版本（极端愚蠢版）
 
 import asyncio
 import aiohttp
+from nb_aiopool import NbAioPool
 
 
 async def make_request(url, session, semaphore):
@@ -28,6 +29,15 @@ async def make_request(url, session, semaphore):
             pass
 
 
+async def make_request_in_pool(url, session):
+    """发送单个HTTP请求，并发由 NbAioPool 控制，不需要 semaphore"""
+    try:
+        async with session.get(url) as response:
+            await response.read()
+    except:
+        pass
+
+
 async def main():
     """主函数 - 请求1000万次"""
     url = "http://localhost:8000"
@@ -46,5 +56,18 @@ async def main():
         print("执行完成")
 
 
+async def main_with_pool():
+    """正确做法 - 请求1000万次，用 NbAioPool 背压，每批提交1万个"""
+    url = "http://localhost:8000"
+    batch_size = 10000
+
+    async with NbAioPool(max_concurrency=1000) as pool, aiohttp.ClientSession() as session:
+        # 队列满时 batch_submit 会等待，同时存活的协程/Task 只有 max_concurrency + 队列大小 + 一批的量，不是1000万
+        for _ in range(0, 10000000, batch_size):
+            await pool.batch_submit([make_request_in_pool(url, session) for _ in range(batch_size)])
+        print("执行完成")
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
+    # asyncio.run(main_with_pool())
\ No newline at end of file
@@ -46,13 +46,16 @@ await pool.submit(my_async_func, arg1)  # 不需要手动等待
 ## 自动等待机制说明
 1. **atexit机制**：当auto_shutdown=True时，在程序退出时自动创建新事件循环执行未完成任务
 2. **smart_run包装器**：替代asyncio.run()，在主协程结束后自动等待所有池中任务完成
-3. **手动等待**：调用async_wait_for_all()方法手动等待所有任务完成
+3. **手动等待**：调用async_wait_for_all()方法手动等待所有任务完成；自己管理事件循环时在 loop.close() 前调用 await_all_sync(loop)
+
+atexit 新建事件循环重新执行任务只是兜底，已不推荐，优先使用 2、3 在原事件循环里等待
 
 注意：此类设计用于需要动态调整并发度的场景，如Web爬虫、API调用等IO密集型任务。
 ```
 """
 
 import signal
+import collections
 import time
 import logging
 import asyncio
@@ -61,6 +64,7 @@ import concurrent.futures
 import sys
 import atexit
 import threading
+import warnings
 from typing import Callable, Any, Coroutine, List, TypeVar, Optional
 
 T = TypeVar("T")
@@ -79,13 +83,21 @@ def _python_exit():
     模仿 ThreadPoolExecutor 的自动等待机制
     
     注意：这个函数需要重新运行未完成的任务，因为原始的事件循环已经关闭
+
+    已不推荐依赖这个兜底：新建事件循环、重置 pool 状态、逐个重新提交任务开销很大，
+    而且执行到一半被取消的任务会从头再执行一次。推荐在原来的事件循环关闭之前等待任务完成：
+    用 smart_run 启动；或者在协程里 await pool.async_wait_for_all()；
+    自己管理事件循环时在 loop.close() 之前调用 pool.await_all_sync(loop)
     """
-    pools_with_tasks = [pool for pool in list(_active_pools) if len(pool._pending_tasks) > 0]
+    # 列表推导式里没有 await，直接遍历 WeakSet 是安全的，不需要先 list() 拷贝一份
+    pools_with_tasks = [pool for pool in _active_pools if pool._pending_tasks]
     
     if not pools_with_tasks:
         return
     
     print(f"🔧 atexit: 发现 {len(pools_with_tasks)} 个pool有未完成任务，自动等待...")
+    print("⚠️  atexit 新建事件循环重新执行任务的方式已不推荐，请改用 smart_run / async_wait_for_all / await_all_sync，"
+          "在原事件循环里等待任务完成")
     
     # 创建新的事件循环（因为旧的已经关闭）
     loop = asyncio.new_event_loop()
@@ -103,31 +115,41 @@ def _python_exit():
                 
                 # 重新启动pool（因为在新循环中）
                 pool._is_running = False
+                pool._started = False
                 pool._is_shutdown = False
                 pool._queue = None
                 pool._lock = None
+                pool._supervisor_wake = None
+                pool._supervisor_task = None
                 pool._workers.clear()
-                pool._worker_busy.clear()
-                pool._pending_futures.clear()
+                pool._idle_count = 0
+                pool._busy_count = 0
+                pool._direct_tasks.clear()
                 pool._pending_tasks.clear()
+                pool._all_done = None
                 
                 try:
                     # 重新初始化并启动
                     await pool._start()
                     
-                    # 重新提交所有任务
+                    # 重新提交所有任务；队列满时 submit 会让出事件循环，提交和执行是交叠进行的
                     futures = []
-                    for func, args, kwargs in pending_tasks:
-                        future = await pool.submit(func, *args, **kwargs)
+                    for item in pending_tasks:
+                        future = await pool.submit(item.func, *item.args, **item.kwargs)
                         futures.append(future)
                     
-                    # 等待所有任务完成
-                    await asyncio.gather(*futures, return_exceptions=True)
+                    # 用 as_completed 逐个等待，先完成的先处理，不构造一个包含全部任务的 gather
+                    failed_count = 0
+                    for future in asyncio.as_completed(futures):
+                        try:
+                            await future
+                        except Exception:
+                            failed_count += 1
                     
                     # 关闭pool
                     await pool.shutdown(wait=True)
                     
-                    print(f"  ✅ pool {id(pool)} 的 {len(pending_tasks)} 个任务已完成")
+                    print(f"  ✅ pool {id(pool)} 的 {len(pending_tasks)} 个任务已完成（失败 {failed_count} 个）")
                 except Exception as e:
                     print(f"  ❌ pool {id(pool)} 执行失败: {e}")
             
@@ -141,6 +163,169 @@ def _python_exit():
             pass
 
 
+class _TaskItem:
+    """一个待执行的任务；用 __slots__，队列和 _pending_tasks 共用同一个对象，不再每次 submit 创建两个 tuple"""
+    __slots__ = ('func', 'args', 'kwargs', 'future')
+
+    def __init__(self, func, args, kwargs, future):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+class _RingQueue:
+    """
+    SmartAioPool 内部使用的有界环形队列，只在单个事件循环内使用，接口是 asyncio.Queue 的子集。
+
+    - 容量向上取整到 2 的幂，用 head/tail 两个递增下标和 mask 定位槽位，不做 deque 的 append/popleft
+    - 未满、全部完成(join) 用 asyncio.Event 通知，task_done 只是一个计数器
+    - 空闲 worker 放在等待者队列里，每次 put 只唤醒一个；不用一个 not_empty Event，否则每次 put 会唤醒全部空闲 worker
+    - maxsize <= 0 表示不限大小，写满时把缓冲区扩大一倍
+    - close() 一次性唤醒全部等待者，之后队列取空时 get() 直接返回 None
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self._maxsize = maxsize
+        capacity = 1
+        while capacity < max(maxsize, 16):
+            capacity <<= 1
+        self._buf: list = [None] * capacity
+        self._mask = capacity - 1
+        self._head = 0
+        self._tail = 0
+        self._getters: collections.deque = collections.deque()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._unfinished_tasks = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._closed = False
+
+    def qsize(self) -> int:
+        return self._tail - self._head
+
+    def empty(self) -> bool:
+        return self._head == self._tail
+
+    def full(self) -> bool:
+        return 0 < self._maxsize <= self._tail - self._head
+
+    def _wakeup_getter(self):
+        getters = self._getters
+        while getters:
+            getter = getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def _grow(self, min_capacity: int):
+        size = self._tail - self._head
+        capacity = len(self._buf)
+        while capacity < min_capacity:
+            capacity <<= 1
+        buf, mask = self._buf, self._mask
+        new_buf = [buf[(self._head + i) & mask] for i in range(size)]
+        new_buf.extend([None] * (capacity - size))
+        self._buf = new_buf
+        self._mask = len(new_buf) - 1
+        self._head = 0
+        self._tail = size
+
+    def put_nowait(self, item):
+        size = self._tail - self._head
+        if 0 < self._maxsize <= size:
+            raise asyncio.QueueFull
+        if size > self._mask:
+            self._grow(size + 1)
+        self._buf[self._tail & self._mask] = item
+        self._tail += 1
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        if size + 1 == self._maxsize:
+            self._not_full.clear()
+        if self._getters:
+            self._wakeup_getter()
+
+    def put_many_nowait(self, items: list) -> int:
+        """尽量多地一次写入，只更新一次计数和事件；返回写入的数量，队列满时可能少于 len(items)"""
+        size = self._tail - self._head
+        n = len(items)
+        if self._maxsize > 0:
+            n = min(n, self._maxsize - size)
+        if n <= 0:
+            return 0
+        if size + n > self._mask + 1:
+            self._grow(size + n)
+        buf, mask, tail = self._buf, self._mask, self._tail
+        for i in range(n):
+            buf[(tail + i) & mask] = items[i]
+        self._tail = tail + n
+        self._unfinished_tasks += n
+        self._finished.clear()
+        if size + n == self._maxsize:
+            self._not_full.clear()
+        for _ in range(n):
+            if not self._getters:
+                break
+            self._wakeup_getter()
+        return n
+
+    async def put(self, item):
+        while 0 < self._maxsize <= self._tail - self._head:
+            await self._not_full.wait()
+        self.put_nowait(item)
+
+    def get_nowait(self):
+        if self._head == self._tail:
+            raise asyncio.QueueEmpty
+        index = self._head & self._mask
+        item = self._buf[index]
+        self._buf[index] = None  # 及时释放引用
+        self._head += 1
+        self._not_full.set()
+        return item
+
+    def close(self):
+        self._closed = True
+        getters = self._getters
+        while getters:
+            getter = getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+
+    async def get(self):
+        while self._head == self._tail:
+            if self._closed:
+                return None
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                # wait_for 超时取消：移出等待者队列；已经被唤醒的话把唤醒机会让给下一个 worker
+                getter.cancel()
+                try:
+                    self._getters.remove(getter)
+                except ValueError:
+                    pass
+                if self._head != self._tail and not getter.cancelled():
+                    self._wakeup_getter()
+                raise
+        return self.get_nowait()
+
+    def task_done(self):
+        if self._unfinished_tasks <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished_tasks -= 1
+        if self._unfinished_tasks == 0:
+            self._finished.set()
+
+    async def join(self):
+        if self._unfinished_tasks > 0:
+            await self._finished.wait()
+
+
 class SmartAioPool:
     def __init__(
         self,
@@ -150,26 +335,42 @@ class SmartAioPool:
         idle_timeout: float = 5.0,
         auto_shutdown: bool = True,  # 自动在程序退出前等待任务完成
     ):
+        """
+        :param max_concurrency: 最大并发数（worker 数 + 直接运行的任务数）
+        :param max_queue_size: 队列大小，<= 0 表示不限
+        :param min_workers: 最少保留的 worker 数
+        :param idle_timeout: worker 空闲多少秒后回收
+        :param auto_shutdown: 自动在程序退出前等待任务完成
+
+        用 smart_run 启动时（默认 use_uvloop=True），安装了 uvloop 就只在这次运行里使用 uvloop 事件循环（需要 Python 3.11+，更低版本发出警告后用标准 asyncio）
+        """
         self._max_concurrency = max_concurrency
         self._min_workers = min_workers
         self._max_queue_size = max_queue_size
-        self._queue: Optional[asyncio.Queue] = None  # 延迟初始化
-        self._workers: List[asyncio.Task] = []
-        self._worker_busy: dict[asyncio.Task, bool] = {}  # True: busy, False: idle
+        self._queue: Optional[_RingQueue] = None  # 延迟初始化
+        self._workers: set[asyncio.Task] = set()  # 用 set，worker 空闲回收时 remove 是 O(1)
+        self._idle_count = 0  # 没有在执行任务的 worker 数量
+        self._busy_count = 0  # 正在执行任务的 worker 数量
         self._is_running = False
+        self._started = False  # 首次启动后一直为 True，submit 热路径只读这一个属性
         self._is_shutdown = False
         self._lock: Optional[asyncio.Lock] = None  # 延迟初始化
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 和队列一起延迟初始化
         self._idle_timeout = idle_timeout
         self._auto_shutdown = auto_shutdown
         
-        # 跟踪所有提交的future，用于自动等待
-        self._pending_futures: set[asyncio.Future] = set()
-        
-        # 用于atexit：保存待执行的任务（因为future会失效）
-        # 使用dict以获得O(1)的删除性能
-        self._pending_tasks: dict[int, tuple] = {}  # {id(future): (func, args, kwargs), ...}
+        # 跟踪所有提交的任务，用于自动等待（仅 auto_shutdown=True 时记录）
+        # 同时用于atexit：保存待执行的任务（因为future会失效）
+        # 使用dict以获得O(1)的删除性能，未完成任务数就是 len(_pending_tasks)
+        self._pending_tasks: dict[int, _TaskItem] = {}  # {id(future): _TaskItem, ...}
+        self._all_done: Optional[asyncio.Event] = None  # 未完成任务数归零时 set，延迟初始化
         
         self._background_task: Optional[asyncio.Task] = None
+        # 后台 supervisor 负责按需创建 worker，submit 只需要 set 一下事件，不用加锁、不用扫描 worker
+        self._supervisor_wake: Optional[asyncio.Event] = None  # 延迟初始化
+        self._supervisor_task: Optional[asyncio.Task] = None
+        # 池没跑满时绕过队列直接运行的任务，也计入 max_concurrency
+        self._direct_tasks: set[asyncio.Task] = set()
         
         # 注册到全局池并注册atexit（只注册一次）
         if self._auto_shutdown:
@@ -187,71 +388,113 @@ class SmartAioPool:
     def _ensure_initialized(self):
         """确保在事件循环中初始化asyncio对象"""
         if self._queue is None:
-            self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+            self._queue = _RingQueue(maxsize=self._max_queue_size)
+            # 缓存事件循环和队列的绑定方法，submit 热路径上少几次属性查找
+            self._loop = asyncio.get_running_loop()
+            self._create_future = self._loop.create_future
+            self._queue_put = self._queue.put
+            self._queue_put_nowait = self._queue.put_nowait
         if self._lock is None:
             self._lock = asyncio.Lock()
+        if self._supervisor_wake is None:
+            self._supervisor_wake = asyncio.Event()
+        if self._all_done is None:
+            self._all_done = asyncio.Event()
+            if not self._pending_tasks:
+                self._all_done.set()
     
     async def _start(self):
         self._ensure_initialized()
-        async with self._lock:
-            if self._is_running:
-                return
-            self._is_running = True
-            for _ in range(self._min_workers):
-                self._create_worker()
+        # 检查和启动之间没有 await，单事件循环下天然是原子的，不需要加锁
+        if self._is_running:
+            return
+        self._is_running = True
+        self._started = True
+        for _ in range(self._min_workers):
+            self._create_worker()
+        self._supervisor_task = asyncio.create_task(self._supervisor())
+
+    async def _supervisor(self):
+        """被 submit 唤醒后检查是否需要新建 worker，只看两个计数，O(1)"""
+        wake = self._supervisor_wake
+        while True:
+            await wake.wait()
+            wake.clear()
+            if self._is_shutdown:
+                break
+            self._maybe_add_worker()
 
     async def _worker(self):
         task = asyncio.current_task()
         while True:
             if self._is_shutdown and self._queue.empty():
                 break
-            try:
-                item = await asyncio.wait_for(
-                    self._queue.get(), timeout=self._idle_timeout
-                )
-            except asyncio.TimeoutError:
-                # 空闲超时，若当前 Worker 超过最小 Worker 数量，则退出
-                async with self._lock:
+            # 队列有积压时直接同步取，只有队列空了才用 wait_for 挂起等待（wait_for 每次都要创建超时句柄）
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                try:
+                    item = await asyncio.wait_for(
+                        self._queue.get(), timeout=self._idle_timeout
+                    )
+                except asyncio.TimeoutError:
+                    # 空闲超时，若当前 Worker 超过最小 Worker 数量，则退出
+                    # 检查和退出之间没有 await，单事件循环下天然是原子的，不需要加锁
                     if len(self._workers) > self._min_workers:
                         break
-                continue
+                    continue
+                if item is None:
+                    # shutdown 关闭了队列，且队列已取空
+                    break
 
-            func, args, kwargs, fut = item
-            self._worker_busy[task] = True
+            fut = item.future
+            self._idle_count -= 1
+            self._busy_count += 1
             try:
-                result = await func(*args, **kwargs)
-                if fut and not fut.cancelled():
-                    fut.set_result(result)
+                # 绝大多数任务没有关键字参数，不带 ** 调用走更快的调用路径
+                kwargs = item.kwargs
+                result = await (item.func(*item.args, **kwargs) if kwargs else item.func(*item.args))
             except Exception as e:
-                if fut and not fut.cancelled():
+                try:
                     fut.set_exception(e)
+                except asyncio.InvalidStateError:  # future 已被调用方取消
+                    pass
+            else:
+                # submit 一定会创建 future；先直接 set，极少数已取消的情况再忽略，省掉每次的 cancelled() 检查
+                try:
+                    fut.set_result(result)
+                except asyncio.InvalidStateError:
+                    pass
             finally:
                 self._queue.task_done()
-                self._worker_busy[task] = False
+                self._idle_count += 1
+                self._busy_count -= 1
 
-        # Worker退出，清理
-        async with self._lock:
-            if task in self._workers:
-                self._workers.remove(task)
-                self._worker_busy.pop(task, None)
+        # Worker退出，清理（同样没有 await，不需要加锁）
+        if task in self._workers:
+            self._workers.remove(task)
+            self._idle_count -= 1
 
     def _create_worker(self):
-        """在锁的保护下创建worker"""
+        """创建worker；没有 await，依赖单事件循环的原子性，不需要加锁"""
         task = asyncio.create_task(self._worker())
-        self._workers.append(task)
-        self._worker_busy[task] = False
+        self._workers.add(task)
+        self._idle_count += 1
         return task
 
-    async def _maybe_add_worker(self):
-        self._ensure_initialized()
-        async with self._lock:
-            if len(self._workers) >= self._max_concurrency:
-                return
-            idle_workers = sum(1 for busy in self._worker_busy.values() if not busy)
-            queue_size = self._queue.qsize()
-            if queue_size > idle_workers and len(self._workers) < self._max_concurrency:
-                task = self._create_worker()
-                logger.debug(f'create worker {id(task)}, queue_size={queue_size}, idle_workers={idle_workers}, total_workers={len(self._workers)}')
+    def _maybe_add_worker(self):
+        """
+        平时只在 supervisor 里调用，shutdown 之后 supervisor 已退出，由 shutdown / _run_direct 直接调用；
+        中间没有 await，单事件循环下不需要加锁。
+        一次唤醒就按积压量补足所需的 worker，同一轮里的大量 submit 只合并成这一次检查。
+        """
+        queue_size = self._queue.qsize()
+        n_needed = min(queue_size - self._idle_count,
+                       self._max_concurrency - len(self._workers) - len(self._direct_tasks))
+        for _ in range(n_needed):
+            self._create_worker()
+        if n_needed > 0:
+            logger.debug(f'create {n_needed} workers, queue_size={queue_size}, idle_workers={self._idle_count}, total_workers={len(self._workers)}')
 
     async def submit(
         self,
@@ -261,43 +504,121 @@ class SmartAioPool:
         future: Optional[asyncio.Future] = None,
         **kwargs
     ) -> asyncio.Future:
+        return await self._submit_core(func, args, kwargs, future, block, self._auto_shutdown)
+
+    async def _submit_core(self, func, args, kwargs, future, block, track) -> asyncio.Future:
+        """
+        submit / run 的共同实现
+        :param track: 是否记录到 _pending_tasks（smart_run / atexit 自动等待用）
+        """
         if self._is_shutdown:
             raise RuntimeError("Pool is shutdown, cannot submit new tasks.")
 
-        if not self._is_running:
+        if not self._started:
             await self._start()
 
         if future is None:
-            future = asyncio.get_running_loop().create_future()
-
-        # 保存任务信息（用于atexit重新执行）
-        # 使用future的id作为key，避免O(n)的list.remove()操作
-        future_id = id(future)
-        task_info = (func, args, kwargs)
-        self._pending_tasks[future_id] = task_info
-
-        # 跟踪future，自动清理已完成的
-        self._pending_futures.add(future)
-        
-        def on_done(f):
-            self._pending_futures.discard(f)
-            # 任务完成后从pending_tasks中移除（O(1)操作）
-            self._pending_tasks.pop(id(f), None)
-        
-        future.add_done_callback(on_done)
+            future = self._create_future()
+        # 队列和 _pending_tasks 共用同一个任务对象
+        item = _TaskItem(func, args, kwargs, future)
+
+        if track:
+            # 只有 auto_shutdown 的 pool 需要跟踪 future（smart_run / atexit 自动等待用），
+            # 普通 pool 跳过这些记录，submit 热路径上少几次 dict/set 操作
+            # 保存任务信息（用于atexit重新执行）
+            # 使用future的id作为key，避免O(n)的list.remove()操作
+            self._pending_tasks[id(future)] = item
+            self._all_done.clear()
+            future.add_done_callback(self._on_future_done)
+
+        # 队列为空、没有空闲 worker、并发还没满时，直接创建 Task 运行，省掉一次 queue put/get 交接
+        if (self._queue.empty() and self._idle_count == 0
+                and len(self._workers) + len(self._direct_tasks) < self._max_concurrency):
+            self._direct_tasks.add(asyncio.create_task(self._run_direct(item)))
+            return future
 
         try:
             if block:
-                await self._queue.put((func, args, kwargs, future))
+                await self._queue_put(item)
             else:
-                self._queue.put_nowait((func, args, kwargs, future))
+                self._queue_put_nowait(item)
         except asyncio.QueueFull:
             future.set_exception(RuntimeError("Queue full"))
 
-        # 尝试增加 Worker
-        await self._maybe_add_worker()
+        # 通知 supervisor 检查是否需要增加 Worker
+        self._supervisor_wake.set()
         return future
 
+    async def submit_many(
+        self,
+        items: List[tuple],
+        block: bool = True,
+    ) -> List[asyncio.Future]:
+        """
+        批量提交任务：能放进队列的一次性写入，只唤醒一次 supervisor，由它一次补足所需的 worker
+
+        :param items: (func, args) 或 (func, args, kwargs) 元组列表，例如 [(my_func, (1, 2)), (my_func, (3,), {'y': 4})]
+        :param block: 队列写满后剩下的任务 True 逐个等待入队，False 直接设置 Queue full 异常
+        :return: Future 列表，和 items 一一对应
+        """
+        if self._is_shutdown:
+            raise RuntimeError("Pool is shutdown, cannot submit new tasks.")
+
+        if not self._started:
+            await self._start()
+
+        task_items = []
+        for task in items:
+            future = self._create_future()
+            item = _TaskItem(task[0], tuple(task[1]), task[2] if len(task) > 2 else {}, future)
+            if self._auto_shutdown:
+                self._pending_tasks[id(future)] = item
+                self._all_done.clear()
+                future.add_done_callback(self._on_future_done)
+            task_items.append(item)
+
+        n = self._queue.put_many_nowait(task_items)
+        self._supervisor_wake.set()
+        # 队列放不下的部分和 submit 一样处理
+        for item in task_items[n:]:
+            if block:
+                await self._queue_put(item)
+                self._supervisor_wake.set()
+            else:
+                item.future.set_exception(RuntimeError("Queue full"))
+        return [item.future for item in task_items]
+
+    async def _run_direct(self, item: "_TaskItem"):
+        fut = item.future
+        try:
+            kwargs = item.kwargs
+            result = await (item.func(*item.args, **kwargs) if kwargs else item.func(*item.args))
+        except Exception as e:
+            try:
+                fut.set_exception(e)
+            except asyncio.InvalidStateError:
+                pass
+        else:
+            try:
+                fut.set_result(result)
+            except asyncio.InvalidStateError:
+                pass
+        finally:
+            # 让出了并发名额，队列里还有积压就补充 worker；shutdown 后 supervisor 已退出，只能在这里直接补
+            self._direct_tasks.discard(asyncio.current_task())
+            if not self._queue.empty():
+                if self._is_shutdown:
+                    self._maybe_add_worker()
+                else:
+                    self._supervisor_wake.set()
+
+    def _on_future_done(self, f: asyncio.Future):
+        """future 完成后移除跟踪记录（O(1)操作）；用绑定方法，避免每次 submit 都创建一个闭包"""
+        pending_tasks = self._pending_tasks
+        pending_tasks.pop(id(f), None)
+        if not pending_tasks:
+            self._all_done.set()
+
     async def run(
         self,
         func: Callable[..., Coroutine[Any, Any, T]],
@@ -306,7 +627,8 @@ class SmartAioPool:
         future: Optional[asyncio.Future] = None,
         **kwargs
     ) -> T:
-        fut = await self.submit(func, *args, block=block, future=future, **kwargs)
+        # run 的调用方会立刻在这里等待结果，不需要再记录到 _pending_tasks、注册完成回调
+        fut = await self._submit_core(func, args, kwargs, future, block, False)
         return await fut
 
     def sync_submit(
@@ -330,10 +652,18 @@ class SmartAioPool:
             if self._is_shutdown:
                 return
             self._is_shutdown = True
+        self._supervisor_wake.set()  # 让 supervisor 退出
+        # supervisor 退出后没人再补 worker：队列里已有积压就先补上，直接运行的任务结束时由 _run_direct 继续补
+        self._maybe_add_worker()
 
         if wait:
             await self._queue.join()
-            
+            if self._direct_tasks:
+                await asyncio.gather(*self._direct_tasks, return_exceptions=True)
+        # 关闭队列，一次性唤醒所有空闲 worker 退出，不用等它们各自的 idle_timeout 超时
+        self._queue.close()
+
+        if wait:
             # 只等待还未完成的worker
             active_workers = [w for w in self._workers if not w.done()]
             if active_workers:
@@ -344,10 +674,16 @@ class SmartAioPool:
                     if 'Event loop is closed' not in str(e):
                         raise
 
+        if self._supervisor_task is not None:
+            await asyncio.gather(self._supervisor_task, return_exceptions=True)
+            self._supervisor_task = None
+
         async with self._lock:
-            self._workers.clear()
-            self._worker_busy.clear()
-            self._pending_futures.clear()
+            # 不能直接清空计数：wait=False 时还有 worker 在执行任务，它们退出时会自己从 _workers 移除并扣减计数；
+            # 这里只清理已经结束、却没走到退出清理的 worker（比如被取消的），它们的 busy 计数已在 finally 里还原
+            for w in [w for w in self._workers if w.done()]:
+                self._workers.discard(w)
+                self._idle_count -= 1
             self._is_running = False
 
     async def __aenter__(self):
@@ -358,16 +694,35 @@ class SmartAioPool:
         await self.shutdown(wait=True)
     
     async def async_wait_for_all(self) -> None:
-        """异步方法：等待所有pending的任务完成"""
-        if self._pending_futures:
-            logger.info(f"Waiting for {len(self._pending_futures)} pending tasks...")
-            await asyncio.gather(*list(self._pending_futures), return_exceptions=True)
+        """异步方法：等待所有pending的任务完成（包括等待期间新提交的任务）"""
+        if self._pending_tasks:
+            logger.info(f"Waiting for {len(self._pending_tasks)} pending tasks...")
+            await self._all_done.wait()
             logger.info("All tasks completed.")
+
+    def await_all_sync(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        同步方法：在原来的事件循环里等待所有pending的任务完成并关闭 pool，不需要 atexit 新建事件循环重新执行。
+        适用于自己管理事件循环的代码，在 finally 里、loop.close() 之前调用；在协程里请用 await async_wait_for_all()
+
+        :param loop: pool 所在的事件循环，默认是 pool 首次启动时的事件循环；
+                     loop 已关闭（比如 asyncio.run 已经返回）时抛 RuntimeError
+        """
+        loop = loop or self._loop
+        if loop is None or not self._started:
+            return
+        if loop.is_closed():
+            # asyncio.run 结束时已经关闭了 loop，pending 的任务没法再在原来的循环里执行
+            raise RuntimeError("事件循环已关闭，请在协程里 await pool.async_wait_for_all()，或者用 smart_run(main()) 代替 asyncio.run")
+        if loop.is_running():
+            raise RuntimeError("事件循环正在运行，请使用 await pool.async_wait_for_all()")
+        loop.run_until_complete(self.async_wait_for_all())
+        loop.run_until_complete(self.shutdown(wait=True))
     
     @property
     def pending_count(self) -> int:
-        """返回当前未完成的任务数量"""
-        return len(self._pending_futures)
+        """返回当前未完成的任务数量（只统计 auto_shutdown=True 的 pool）"""
+        return len(self._pending_tasks)
     
     @property
     def worker_count(self) -> int:
@@ -377,20 +732,22 @@ class SmartAioPool:
     @property
     def busy_worker_count(self) -> int:
         """返回繁忙的worker数量"""
-        return sum(1 for busy in self._worker_busy.values() if busy)
+        return self._busy_count
     
     @property
     def idle_worker_count(self) -> int:
         """返回空闲的worker数量"""
-        return sum(1 for busy in self._worker_busy.values() if not busy)
+        return self._idle_count
     
     def __repr__(self) -> str:
         """返回pool的字符串表示"""
         return (
             f"SmartAioPool("
             f"workers={len(self._workers)}, "
-            f"busy={self.busy_worker_count}, "
-            f"pending={len(self._pending_futures)}, "
+            f"busy={self._busy_count}, "
+            f"idle={self._idle_count}, "
+            f"direct={len(self._direct_tasks)}, "
+            f"pending={len(self._pending_tasks)}, "
             f"max={self._max_concurrency}, "
             f"running={self._is_running})"
         )
@@ -398,11 +755,14 @@ class SmartAioPool:
     async def cancel_all(self):
         """取消所有pending的任务"""
         cancelled_count = 0
-        for future in list(self._pending_futures):
+        for item in list(self._pending_tasks.values()):
+            future = item.future
             if not future.done():
                 future.cancel()
                 cancelled_count += 1
-        self._pending_futures.clear()
+        self._pending_tasks.clear()
+        if self._all_done is not None:
+            self._all_done.set()
         logger.info(f"Cancelled {cancelled_count} pending tasks.")
         return cancelled_count
 
@@ -411,9 +771,15 @@ class SmartAioPool:
 # 智能 asyncio.run 包装器
 # ======================
 
-def smart_run(coro, *, debug=False):
+def smart_run(coro, *, debug=False, use_uvloop=True):
     """
     智能的 asyncio.run 包装器，自动等待所有pool的pending任务完成
+
+    use_uvloop=True（默认）时如果安装了 uvloop 就用 uvloop 事件循环运行这一次，没安装则还是标准 asyncio。
+    通过 asyncio.Runner(loop_factory=...) 实现（Python 3.11+），不修改全局事件循环策略，
+    之后同一进程里的 asyncio.run 不受影响。
+    Python 3.11 以下没有 loop_factory，又不想为此改全局策略，装了 uvloop 也退回标准 asyncio 并发出 RuntimeWarning；
+    这些版本上需要 uvloop 时自己先调用 nb_aiopool.install_fast_loop()（进程级别的设置）
     
     用法:
         pool = SmartAioPool(auto_shutdown=True)
@@ -430,20 +796,30 @@ def smart_run(coro, *, debug=False):
             result = await coro
             
             # 自动等待所有活跃pool的pending任务
-            for pool in list(_active_pools):
-                if pool.pending_count > 0:
-                    logger.info(f"🔧 Auto-waiting for {pool.pending_count} pending tasks in pool...")
-                    await pool.async_wait_for_all()
+            # 循环里有 await，期间可能有新 pool 注册到 WeakSet，所以先筛出有任务的 pool，只拷贝这一小部分
+            for pool in [p for p in _active_pools if p._pending_tasks]:
+                logger.info(f"🔧 Auto-waiting for {pool.pending_count} pending tasks in pool...")
+                await pool.async_wait_for_all()
             
             return result
         except Exception as e:
             # 即使出错也要等待pending任务
-            for pool in list(_active_pools):
-                if pool.pending_count > 0:
-                    logger.warning(f"⚠️  Exception occurred, but still waiting for {pool.pending_count} pending tasks...")
-                    await pool.async_wait_for_all()
+            for pool in [p for p in _active_pools if p._pending_tasks]:
+                logger.warning(f"⚠️  Exception occurred, but still waiting for {pool.pending_count} pending tasks...")
+                await pool.async_wait_for_all()
             raise
     
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            if hasattr(asyncio, 'Runner'):
+                with asyncio.Runner(debug=debug, loop_factory=uvloop.new_event_loop) as runner:
+                    return runner.run(wrapper())
+            warnings.warn('smart_run(use_uvloop=True) 需要 Python 3.11+ 的 asyncio.Runner，'
+                          '当前版本使用标准 asyncio 事件循环', RuntimeWarning, stacklevel=2)
     return asyncio.run(wrapper(), debug=debug)
 
 async def shutdown_all_smart_aiopools():
@@ -527,6 +903,39 @@ if __name__ == "__main__":
     
     asyncio.run(test_atexit_magic())
     print(f"📊 asyncio.run 退出后，pending count: {pool4.pending_count}")
+
+    # ========= 测试5：自己管理事件循环 + await_all_sync =========
+    print("\n" + "="*50)
+    print("测试5：自己管理事件循环，在 loop.close() 之前 await_all_sync")
+    print("="*50)
+    pool5 = SmartAioPool(max_concurrency=100, min_workers=0, auto_shutdown=True)
+    async def test_await_all_sync():
+        await pool5.submit(sample_task, 50)
+        await pool5.submit(sample_task, 51)
+        print(f"📊 提交了2个任务，pending count: {pool5.pending_count}")
+
+    loop5 = asyncio.new_event_loop()
+    try:
+        loop5.run_until_complete(test_await_all_sync())
+    finally:
+        pool5.await_all_sync(loop5)  # 任务在原事件循环里执行完，不依赖 atexit
+        loop5.close()
+    print(f"✅ loop 关闭前任务已完成，pending count: {pool5.pending_count}")
+
+    # ========= 测试6：直接运行的任务占满并发、队列积压时 shutdown 不能卡死 =========
+    print("\n" + "="*50)
+    print("测试6：min_workers=0，直接运行的任务占满并发，队列里还有积压时 shutdown")
+    print("="*50)
+    async def test_shutdown_drains_backlog():
+        pool6 = SmartAioPool(max_concurrency=2, min_workers=0, auto_shutdown=False)
+        # 前2个直接运行，后2个进队列，此时还没有任何 worker
+        futures = [await pool6.submit(sample_task, 60 + i) for i in range(4)]
+        await asyncio.wait_for(pool6.shutdown(wait=True), timeout=5)
+        assert all(f.done() for f in futures), futures
+        print(f"✅ shutdown 正常返回，结果: {[f.result() for f in futures]}")
+
+    asyncio.run(test_shutdown_drains_backlog())
+
     print("⏳ 等待程序退出时的 atexit 清理...")
-    # atexit 会在这里自动运行！
+    # atexit 会在这里自动运行！（只剩测试4的 pool4）
 
@@ -1,32 +1,81 @@
+"""
+运行: python tests/backup/t_bech.py [--monitor] [--queue]
+fast_run 来自现在的 nb_aiopool 包；旧版各种 pool 已不在 nb_aiopool 包里，从 tests/backup 这个包的 __init__ 统一导入
+"""
 import asyncio
 import time
-import psutil
 import os
 import sys
-from nb_libs import system_monitoring
 
-from nb_aiopool.smart_aiopool import SmartAioPool 
-from nb_aiopool.common_aiopool import CommonAioPool ,shutdown_all_common_aiopools
-from nb_aiopool.no_queue_aiopool import NoQueueAioPool, wait_all_no_queue_aiopools
-from nb_aiopool.no_queue_aiopool_use_condition import NoQueueAioPoolUseCondition ,wait_all_no_queue_aiopools_use_condition
+from nb_aiopool import fast_run
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # tests 目录，让 backup 可以作为包导入
+from backup import (SmartAioPool, CommonAioPool, shutdown_all_common_aiopools,
+                    NoQueueAioPool, wait_all_no_queue_aiopools,
+                    NoQueueAioPoolUseCondition, wait_all_no_queue_aiopools_use_condition)
+
+_COUNTER = [0]  # 已执行任务数，用单元素列表避免 global 声明
+
 
 async def small_task(x: int):
     """简单的任务，避免任务本身占用太多资源"""
     # await asyncio.sleep(100)  # 1ms
-    if x%20000 == 0:
-        print(f"{time.strftime('%H:%M:%S')},正在执行任务: {x}")
-    return x * 2
+    _COUNTER[0] += 1
+    return x + x
+
+
+async def _report():
+    """进度打印放到后台每秒一次，不占用任务本身的热路径"""
+    while True:
+        await asyncio.sleep(1)
+        print(time.strftime('%H:%M:%S'), '已执行任务数:', _COUNTER[0])
+
+# 总并发 1000 分到 N 个 pool，每个 pool 由自己的生产者协程喂任务；NoQueueAioPoolUseCondition 的 waiter 列表也随之缩短到 1/N
+# 超过 1000 核时每个 pool 至少也要有 1 个并发
+N = min(os.cpu_count() or 1, 1000)
+
+
+def _make_pools():
+    """在 test 协程里、asyncio.run 创建的 loop 中才创建 pool，import 时不创建任何 pool"""
+    # return [NoQueueAioPoolUseCondition(max_concurrency=1000 // N) for _ in range(N)]
+    return [NoQueueAioPool(max_concurrency=1000 // N) for _ in range(N)]
+
+TOTAL = 1000001
+MIN_BATCH = 2000
+MAX_BATCH = 20000
+
+
+def _next_batch_size(pool):
+    """池快满时推大批（反正要等空位，少切几次），池空闲时推小批，尽快把空位喂满"""
+    if pool.active_count >= pool.max_concurrency * 0.9:
+        return MAX_BATCH
+    return MIN_BATCH
+
+
+async def _produce(pool, start, stop):
+    while start < stop:
+        end = min(start + _next_batch_size(pool), stop)
+        # small_task 不用 contextvars，整批共用一份上下文，省掉每个 task 的 Context 分配
+        await pool.batch_submit([small_task(i) for i in range(start, end)], copy_context=False)
+        start = end
+
 
-# pool = NoQueueAioPoolUseCondition(max_concurrency=1000)
-pool = NoQueueAioPool(max_concurrency=1000)
 async def test_100k_tasks():
     # pool = CommonAioPool(max_concurrency=1000, min_workers=10, auto_shutdown=True)
     # pool = CommonAioPool(max_concurrency=1000, )
     
 
-    for i in range(1000001):
-        # await pool.submit(small_task, i)
-        await pool.submit(small_task(i))
+    # for i in range(TOTAL):
+    #     await pool.submit(small_task(i))  # 每个任务一次 await，100万次提交开销都在这里
+    pools = _make_pools()
+    reporter = asyncio.create_task(_report())
+    # 每个分片一个生产者、各提交一段连续的任务：某个分片满了只挂起它自己的生产者，其他分片照常被喂满。
+    # 只用一个生产者轮流喂的话，它阻塞在一个分片上时其他分片都会跑空。
+    bounds = [TOTAL * k // N for k in range(N + 1)]
+    await asyncio.gather(*(_produce(pool, bounds[k], bounds[k + 1]) for k, pool in enumerate(pools)))
+    await asyncio.gather(*(pool.wait() for pool in pools))
+    reporter.cancel()
+    print('已执行任务数:', _COUNTER[0])
     
     # await wait_all_no_queue_aiopools()
     # await wait_all_no_queue_aiopools_use_condition()
@@ -34,8 +83,32 @@ async def test_100k_tasks():
     # await SmartAioPool.shutdown()
 
 
+async def test_100k_tasks_queue_workers(num_workers: int = 1000):
+    """对照组：生产者 -> asyncio.Queue(有界) -> 固定数量消费者，也就是 pool 内部做的事情，不经过任何 pool"""
+    q = asyncio.Queue(maxsize=2 * num_workers)
+
+    async def producer():
+        for i in range(TOTAL):
+            await q.put(i)
+        for _ in range(num_workers):
+            await q.put(None)
+
+    async def consumer():
+        while (i := await q.get()) is not None:
+            await small_task(i)
+
+    reporter = asyncio.create_task(_report())
+    await asyncio.gather(producer(), *[consumer() for _ in range(num_workers)])
+    reporter.cancel()
+    print('已执行任务数:', _COUNTER[0])
+
+
 if __name__ == "__main__":
-    system_monitoring.thread_show_process_cpu_usage(1)
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(test_100k_tasks())
-    # loop.run_forever()
+    # 监控线程每次采样都要抢 GIL，压测时默认不开，需要时加 --monitor 参数，5秒采样一次
+    if '--monitor' in sys.argv:
+        from nb_libs import system_monitoring  # 依赖 psutil，只有开监控时才需要
+        system_monitoring.thread_show_process_cpu_usage(5)
+    if '--queue' in sys.argv:
+        fast_run(test_100k_tasks_queue_workers())
+    else:
+        fast_run(test_100k_tasks())  # 装了 uvloop 就用 uvloop，否则等价于 asyncio.run
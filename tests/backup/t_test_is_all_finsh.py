@@ -5,11 +5,11 @@ import os
 import sys
 from nb_libs import system_monitoring
 
-from nb_aiopool.smart_aiopool import SmartAioPool 
-from nb_aiopool.common_aiopool import CommonAioPool ,shutdown_all_common_aiopools
-from nb_aiopool.no_queue_aiopool import NoQueueAioPool, wait_all_no_queue_aiopools
-from nb_aiopool.no_queue_aiopool_use_condition import NoQueueAioPoolUseCondition ,wait_all_no_queue_aiopools_use_condition
-from nb_aiopool import wait_all_types_aiopools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # tests 目录，让 backup 可以作为包导入
+from backup import (SmartAioPool, CommonAioPool, shutdown_all_common_aiopools,
+                    NoQueueAioPool, wait_all_no_queue_aiopools,
+                    NoQueueAioPoolUseCondition, wait_all_no_queue_aiopools_use_condition,
+                    wait_all_types_aiopools)
 async def small_task(x: int):
     """简单的任务，避免任务本身占用太多资源"""
     await asyncio.sleep(0.1)  # 1ms
@@ -1,9 +1,16 @@
 """
-测试 NoQueueAioPool 的死锁检测和优化功能
+演示 NoQueueAioPool 嵌套提交子任务时的死锁，以及几种避免办法
+运行: python tests/backup/test_deadlock_detection.py
+旧版 NoQueueAioPool 已不在 nb_aiopool 包里，从 tests/backup 这个包的 __init__ 导入；
+它的 submit 不做死锁检测、也没有 timeout / block 参数，这里用 asyncio.wait_for 和 semaphore.locked() 实现同样的演示
 """
 import asyncio
-import warnings
-from nb_aiopool import NoQueueAioPool
+import functools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # tests 目录，让 backup 可以作为包导入
+from backup import NoQueueAioPool
 
 async def nested_task(x):
     """嵌套的子任务"""
@@ -15,41 +22,53 @@ async def parent_task(pool, x):
     """父任务，会在内部提交子任务"""
     await asyncio.sleep(0.1)
     print(f"parent_task {x} started")
-    # 这里会触发死锁检测警告
-    result = await pool.submit(nested_task(x))
-    print(f"parent_task {x} got result: {await result}")
+    # 父任务占着槽位再去同一个 pool 抢槽位，槽位被父任务占满时就会自己等自己
+    value = await pool.run(nested_task(x))
+    print(f"parent_task {x} got result: {value}")
     return x
 
+async def collect_as_completed(futures):
+    """
+    等所有 future 完成后返回结果列表，按完成顺序排列（不是提交顺序）；
+    和 gather(return_exceptions=True) 一样，异常和被取消的 CancelledError 都当作结果收集
+    """
+    results = []
+    for fut in asyncio.as_completed(futures):
+        try:
+            results.append(await fut)
+        except (Exception, asyncio.CancelledError) as e:
+            results.append(e)
+    return results
+
 # ==========================================
-# 测试1: 演示死锁问题（启用警告）
+# 测试1: 演示死锁问题
 # ==========================================
-async def test_deadlock_with_warning():
+async def test_deadlock():
     print("\n" + "="*60)
-    print("测试1: 演示死锁风险（启用警告检测）")
+    print("测试1: 演示死锁风险（用 wait_for 超时发现死锁）")
     print("="*60)
     
     # 创建一个小容量的pool，容易触发死锁
-    pool = NoQueueAioPool(max_concurrency=3, enable_nested_task_warning=True)
-    
-    print(f"Pool 状态: {pool}")
-    
-    # 捕获警告
-    with warnings.catch_warnings(record=True) as w:
-        warnings.simplefilter("always")
-        
-        try:
-            # 提交任务，会触发死锁
-            tasks = [await pool.submit(parent_task(pool, i)) for i in range(5)]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            print(f"结果: {results}")
-        except Exception as e:
-            print(f"捕获异常: {e}")
-        
-        # 显示警告信息
-        if w:
-            print(f"\n捕获到 {len(w)} 个警告:")
-            for warning in w:
-                print(f"  ⚠️  {warning.message}")
+    pool = NoQueueAioPool(max_concurrency=3)
+    
+    print(f"Pool 状态: active={pool.active_count}/{pool.max_concurrency}")
+    
+    async def submit_and_collect():
+        _parent = functools.partial(parent_task, pool)  # pool 只绑定一次
+        # 用生成器按需创建协程，卡住时后面的父任务协程还没创建
+        futures = await pool.batch_submit(_parent(i) for i in range(5))
+        return await collect_as_completed(futures)
+    
+    try:
+        results = await asyncio.wait_for(submit_and_collect(), timeout=2.0)
+        print(f"结果: {results}")
+    except asyncio.TimeoutError:
+        # 3 个父任务占满槽位，都在等子任务的槽位，谁也不会释放
+        print(f"  ⚠️  2秒内没有完成，发生死锁: active={pool.active_count}/{pool.max_concurrency}")
+        for t in list(pool.tasks):
+            t.cancel()
+        await pool.wait()
+        print(f"已取消卡住的任务: active={pool.active_count}")
 
 # ==========================================
 # 测试2: 使用 timeout 避免永久阻塞
@@ -59,21 +78,22 @@ async def test_with_timeout():
     print("测试2: 使用 timeout 避免死锁")
     print("="*60)
     
-    pool = NoQueueAioPool(max_concurrency=3, enable_nested_task_warning=False)
+    pool = NoQueueAioPool(max_concurrency=3)
     
     async def parent_with_timeout(pool, x):
         await asyncio.sleep(0.1)
         print(f"parent {x} started")
         try:
-            # 使用 timeout，如果1秒内无法提交则超时
-            result = await pool.submit(nested_task(x), timeout=1.0)
-            return await result
-        except TimeoutError as e:
-            print(f"  ⚠️  parent {x} timeout: {e}")
+            # submit 没有 timeout 参数，用 wait_for 包一层：1秒内拿不到槽位就超时，没提交成功的协程由 submit 关掉
+            fut = await asyncio.wait_for(pool.submit(nested_task(x)), timeout=1.0)
+        except asyncio.TimeoutError:
+            print(f"  ⚠️  parent {x} timeout: 1秒内没有拿到槽位")
             return None
+        return await fut
     
-    tasks = [await pool.submit(parent_with_timeout(pool, i)) for i in range(5)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    _parent = functools.partial(parent_with_timeout, pool)  # pool 只绑定一次
+    futures = await pool.batch_submit([_parent(i) for i in range(5)])
+    results = await collect_as_completed(futures)
     print(f"结果: {results}")
 
 # ==========================================
@@ -81,25 +101,24 @@ async def test_with_timeout():
 # ==========================================
 async def test_non_blocking():
     print("\n" + "="*60)
-    print("测试3: 使用非阻塞模式 (block=False)")
+    print("测试3: 使用非阻塞模式（池满时不提交）")
     print("="*60)
     
-    pool = NoQueueAioPool(max_concurrency=3, enable_nested_task_warning=False)
+    pool = NoQueueAioPool(max_concurrency=3)
     
     async def parent_non_blocking(pool, x):
         await asyncio.sleep(0.1)
         print(f"parent {x} started")
-        try:
-            # 非阻塞提交，如果池满则立即失败
-            result = await pool.submit(nested_task(x), block=False)
-            return await result
-        except RuntimeError as e:
-            print(f"  ⚠️  parent {x} 提交失败: 池已满")
+        # submit 没有 block 参数，先看 semaphore 有没有空位，池满就不去等槽位
+        if pool.semaphore.locked():
+            print(f"  ⚠️  parent {x} 不提交: 池已满")
             # 降级方案：直接执行，不通过池
             return await nested_task(x)
+        return await pool.run(nested_task(x))
     
-    tasks = [await pool.submit(parent_non_blocking(pool, i)) for i in range(5)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    _parent = functools.partial(parent_non_blocking, pool)  # pool 只绑定一次
+    futures = await pool.batch_submit([_parent(i) for i in range(5)])
+    results = await collect_as_completed(futures)
     print(f"结果: {results}")
 
 # ==========================================
@@ -111,20 +130,20 @@ async def test_correct_way():
     print("="*60)
     
     # 为嵌套任务预留足够空间
-    pool = NoQueueAioPool(max_concurrency=100, enable_nested_task_warning=False)
+    pool = NoQueueAioPool(max_concurrency=100)
     
     async def parent_correct(pool, x):
         await asyncio.sleep(0.1)
         print(f"parent {x} started")
-        result = await pool.submit(nested_task(x))
-        final = await result
+        final = await pool.run(nested_task(x))
         print(f"parent {x} finished with result: {final}")
         return final
     
-    tasks = [await pool.submit(parent_correct(pool, i)) for i in range(10)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    _parent = functools.partial(parent_correct, pool)  # pool 只绑定一次
+    futures = await pool.batch_submit([_parent(i) for i in range(10)])
+    results = await collect_as_completed(futures)
     print(f"结果: {results}")
-    print(f"Pool 状态: {pool}")
+    print(f"Pool 状态: active={pool.active_count}/{pool.max_concurrency}")
 
 # ==========================================
 # 测试5: 使用独立的 pool
@@ -134,32 +153,57 @@ async def test_separate_pools():
     print("测试5: 使用独立的 pool 处理嵌套任务")
     print("="*60)
     
-    pool_level1 = NoQueueAioPool(max_concurrency=3, enable_nested_task_warning=False)
-    pool_level2 = NoQueueAioPool(max_concurrency=10, enable_nested_task_warning=False)
+    pool_level1 = NoQueueAioPool(max_concurrency=3)
+    # 子池和父池共用 loop、各自独立控制并发，按层级分池就不可能出现自己等自己的死锁
+    pool_level2 = pool_level1.child(max_concurrency=10)
     
     async def parent_separate_pool(x):
         await asyncio.sleep(0.1)
         print(f"parent {x} started (pool1: {pool_level1.active_count} tasks)")
         # 使用不同的 pool
-        result = await pool_level2.submit(nested_task(x))
-        final = await result
+        final = await pool_level2.run(nested_task(x))
         print(f"parent {x} finished with result: {final}")
         return final
     
-    tasks = [await pool_level1.submit(parent_separate_pool(i)) for i in range(5)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    futures = await pool_level1.batch_submit([parent_separate_pool(i) for i in range(5)])
+    results = await collect_as_completed(futures)
     print(f"结果: {results}")
-    print(f"Pool1 状态: {pool_level1}")
-    print(f"Pool2 状态: {pool_level2}")
+    print(f"Pool1 状态: active={pool_level1.active_count}/{pool_level1.max_concurrency}")
+    print(f"Pool2 状态: active={pool_level2.active_count}/{pool_level2.max_concurrency}")
+
+
+# ==========================================
+# 测试6: collect_as_completed 收集异常和取消
+# ==========================================
+async def failing_task():
+    await asyncio.sleep(0.05)
+    raise ValueError("failing_task 出错")
+
+async def cancelled_task():
+    """任务内部 await 了一个被取消的 future，任务本身以取消结束"""
+    fut = asyncio.get_running_loop().create_future()
+    fut.cancel()
+    await fut
+
+async def test_collect_exceptions():
+    print("\n" + "="*60)
+    print("测试6: collect_as_completed 和 gather(return_exceptions=True) 一样收集异常和取消")
+    print("="*60)
+    
+    pool = NoQueueAioPool(max_concurrency=3)
+    futures = await pool.batch_submit([nested_task(1), failing_task(), cancelled_task()])
+    results = await collect_as_completed(futures)
+    print(f"结果: {[type(r).__name__ if isinstance(r, BaseException) else r for r in results]}")
 
 
 async def main():
     """运行所有测试"""
-    await test_deadlock_with_warning()
+    await test_deadlock()
     await test_with_timeout()
     await test_non_blocking()
     await test_correct_way()
     await test_separate_pools()
+    await test_collect_exceptions()
     
     print("\n" + "="*60)
     print("✅ 所有测试完成")
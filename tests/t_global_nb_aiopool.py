@@ -3,11 +3,11 @@
 演示全局变量使用 nb_aiopool，可以多个函数和模块公用一个pool
 
 注意：
-要使代码最后一行一定要用 loop.run_forever() 来运行loop，不然就会导致程序提前退出，导致任务压根就没执行提前丢失。
+main 最后一定要 await aiopool.join() 等待任务（包括任务里再提交的子任务）全部完成，不然 asyncio.run 返回时程序提前退出，导致任务压根就没执行提前丢失。
 """
 
 import asyncio
-from nb_aiopool import NbAioPool
+from nb_aiopool import NbAioPool, fast_run
 
 
 aiopool = NbAioPool(max_concurrency=3) # 演示全局变量使用 aiopool 的场景
@@ -22,12 +22,25 @@ async def fun_level2(a,b):
     await asyncio.sleep(2)
     print(a,b)
 
+async def fun_combined(x):
+    """fun_level1 + fun_level2 合成一个任务：每个 x 只占一次池子，也不会出现父任务占满槽位等子任务的情况"""
+    await asyncio.sleep(1)
+    print(x)
+    await asyncio.sleep(2)
+    print(x*2,x*3)
+
 async def main():
+    for i in range(30):
+        await aiopool.submit(fun_combined(i))
+    await aiopool.join()  # 切记不能少，不然就会导致程序提前退出，导致任务压根就没执行提前丢失。
+
+async def main_nested():
+    """演示在任务里面继续用全局 pool 提交子任务"""
     for i in range(30):
         await aiopool.submit(fun_level1(i)) 
+    await aiopool.join()  # 切记不能少，不然就会导致程序提前退出，导致任务压根就没执行提前丢失。
 
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.create_task(main())
-    loop.run_forever()  # 切记不能少，不然就会导致程序提前退出，导致任务压根就没执行提前丢失。
\ No newline at end of file
+    fast_run(main())  # 装了 uvloop 就用 uvloop，否则等价于 asyncio.run(main())
+    # fast_run(main_nested())
\ No newline at end of file
@@ -1,13 +1,14 @@
 
 import asyncio
+from nb_aiopool import fast_run
 from nb_aiopool.contrib.nb_aio_task import aio_task, batch_consume
 
 @aio_task(queue_name="my_queue1", max_concurrency=100)
 async def my_fun1(x, y):
     await asyncio.sleep(1)
     print(f"my_fun1: {x}, {y}")
-    for i in range(5): # 消费函数可以继续向其他队列中发消息
-        await my_fun2.submit(a=x*3 + i)
+    # 消费函数可以继续向其他队列中发消息，submit_many 把5条消息合并成一次 RPUSH
+    await my_fun2.submit_many([((), {'a': x*3 + i}) for i in range(5)])
     return x + y
 
 @aio_task(queue_name="my_queue2", max_concurrency=50)
@@ -23,11 +24,11 @@ async def main():
     print(f"直接运行函数: {await my_fun1(1,2)}")
 
     # 提交任务
-    for i in range(100):
-        await my_fun1.submit(i, i+1)
+    # 批量提交，100 个任务只要一次 RPUSH 往返
+    await my_fun1.submit_many([((i, i+1), {}) for i in range(100)])
     
     # 启动消费者（阻塞运行）
     await batch_consume([my_fun1, my_fun2])
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    fast_run(main())
\ No newline at end of file
@@ -39,12 +39,35 @@ async def main_batch_submit():
         results = await asyncio.gather(*futures)
         print(results, len(results),len(futures))
 
+async def main_batch_submit_generator():
+    async with NbAioPool(max_concurrency=10, max_queue_size=1000) as pool:
+        # 传生成器，边生成边提交，连协程列表都不用建
+        futures = await pool.batch_submit(sample_task(i) for i in range(100))
+        results = await asyncio.gather(*futures)
+        print(results, len(results),len(futures))
+
 async def main_batch_run():
     async with NbAioPool(max_concurrency=10, max_queue_size=1000) as pool:
         coros = [sample_task(i) for i in range(100)]
         results = await pool.batch_run(coros)
         print(results,len(results),len(coros))
 
+async def cancelled_inside():
+    """任务内部 await 了一个被取消的 future，CancelledError 会漏出任务"""
+    fut = asyncio.get_running_loop().create_future()
+    fut.cancel()
+    await fut
+
+async def main_task_leaks_cancelled_error():
+    # 漏出 CancelledError 的任务只会让它所在的 worker 退出，pool 会补上新的 worker，后续任务照常执行
+    async with NbAioPool(max_concurrency=10, max_queue_size=1000) as pool:
+        try:
+            await (await pool.submit(cancelled_inside()))  # 用 submit 交给 worker 执行，run 的快速路径会在当前协程里直接执行
+        except asyncio.CancelledError:
+            print("cancelled_inside 被取消")
+        result = await asyncio.wait_for(await pool.submit(sample_task(1)), timeout=5)
+        print("后续任务结果:", result)
+
 if __name__ == "__main__":
     import nb_log
 
@@ -53,6 +76,8 @@ if __name__ == "__main__":
     # asyncio.run(main3())
     
     # asyncio.run(main_batch_submit())
+    # asyncio.run(main_batch_submit_generator())
+    # asyncio.run(main_task_leaks_cancelled_error())
     asyncio.run(main_batch_run())
 
 
@@ -7,7 +7,7 @@
 
 演示无背压和有背压的的情况下，执行100万个非常简单的sleep任务，占用内存和cpu情况
 
-通过ps_util包封装的 thread_show_process_cpu_usage(1) 和 thread_show_process_memory_usage(1) 每秒打印当前进程占用的cpu和内存情况。
+通过ps_util包封装的 thread_show_process_cpu_usage 和 thread_show_process_memory_usage 打印当前进程占用的cpu和内存情况，运行时加 --monitor 参数开启，每5秒打印一次。
 
 如果采用 no_pool_main + aio_task_use_semaphore ，电脑长时间 100% cpu，演示到中途，内存占用迅速飙到10GB导致电脑死机。有些人还以为 async with semaphore 就万事大吉了呢。
 如果采用 pool_main + aio_task ，电脑 cpu 使用率 1% ，内存持续稳定在 43M。
@@ -17,21 +17,26 @@ no_pool_main 里面用 asyncio.Semaphore 没有背压，电脑直接挂掉死机
 """
 
 import asyncio
+import sys
 from nb_aiopool import NbAioPool
 from nb_libs.system_monitoring import thread_show_process_cpu_usage,thread_show_process_memory_usage
 
 
 
+PREFIX = 'task' * 100  # 100万个任务的前缀都一样，只拼一次
+BATCH_SIZE = 5000
+
+
 async def aio_task_use_semaphore(strx,n,semaphore):
     async with semaphore:
         await asyncio.sleep(5)
         print(n)
         return strx
 
-async def aio_task(strx,n):
+async def aio_task(n):
     await asyncio.sleep(5)
     print(n)
-    return strx
+    return f"{PREFIX}_{n}"  # 字符串在任务执行时才拼，同时存在的只有正在执行的那些，不会提交时就建好100万个
    
 async def no_pool_main(): 
     # 极端愚蠢的做法：直接创建1000万个任务
@@ -40,7 +45,7 @@ async def no_pool_main():
     semaphore = asyncio.Semaphore(1000)
     
     # 极端愚蠢，瞬间创建1000万个任务，导致内存激增，loop cpu压力也大
-    tasks = [asyncio.create_task(aio_task_use_semaphore(f"{'task' * 100}_{i}",i,semaphore)) for i in range(1000000)] 
+    tasks = [asyncio.create_task(aio_task_use_semaphore(f"{PREFIX}_{i}",i,semaphore)) for i in range(1000000)] 
     # 执行所有请求
     print("开始执行aio_task任务...")
     await asyncio.gather(*tasks)
@@ -48,15 +53,19 @@ async def no_pool_main():
 
 async def pool_main():
     async with NbAioPool(max_concurrency=1000) as pool:
-        for i in range(1000000): 
-            await pool.submit(aio_task(f"{'task' * 100}_{i}",i)) # 只要你别保存100万futures到列表，内存就很小。
-            # futures = [await pool.submit(aio_task(f"{'task' * 100}_{i}",i)) for i in range(1000000)] #  这样保存100万 futures 内存才大，nb_aiopool 不需要用户等待futures完成.
+        for start in range(0, 1000000, BATCH_SIZE):
+            # 每批 BATCH_SIZE 个协程一起提交，batch_submit 返回的 futures 不保存，内存依然很小。
+            await pool.batch_submit([aio_task(i) for i in range(start, start + BATCH_SIZE)])
+            # await pool.submit(aio_task(i)) # 只要你别保存100万futures到列表，内存就很小。
+            # futures = [await pool.submit(aio_task(i)) for i in range(1000000)] #  这样保存100万 futures 内存才大，nb_aiopool 不需要用户等待futures完成.
 
 
 
 
 if __name__ == "__main__":
-    thread_show_process_cpu_usage(1)
-    thread_show_process_memory_usage(1)
+    # 监控线程每次采样都要抢 GIL，默认不开，需要看 cpu/内存时加 --monitor 参数，5秒采样一次
+    if '--monitor' in sys.argv:
+        thread_show_process_cpu_usage(5)
+        thread_show_process_memory_usage(5)
     # asyncio.run(no_pool_main())
     asyncio.run(pool_main())
\ No newline at end of file